@@ -1,74 +1,453 @@
-from datetime import datetime, timedelta, timezone
-from collections import defaultdict
+import warnings
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
 
 from backend.app.db.session import SessionLocal
-from backend.app.db.schema import Event
+from backend.app.db.schema import Event, EventBucketCount
+from backend.app.analytics.cache import versioned_cache
+from backend.app.analytics.kleinberg import check_params, kleinberg_bursts
+from backend.app.analytics.rollup import (
+    GRANULARITY_DAY,
+    GRANULARITY_MONTH,
+    GRANULARITY_QUARTER,
+    GRANULARITY_WEEK,
+)
+
+
+# Rollup level -> (NumPy datetime unit, bucket width in that unit)
+_LEVEL_UNITS = {
+    GRANULARITY_DAY: ("D", 1),
+    GRANULARITY_WEEK: ("D", 7),
+    GRANULARITY_MONTH: ("M", 1),
+    GRANULARITY_QUARTER: ("M", 3),
+}
+
+
+@dataclass
+class BucketSeries:
+    """
+    Dense per-bucket event counts for one series.
+
+    counts[i] is the number of events in the bucket starting at
+    bucket_starts[i]; empty buckets are included as zeros.
+    """
+    bucket_starts: np.ndarray  # datetime64[s]
+    counts: np.ndarray
+    granularity: str
+
+
+def resolve_level(bucket_days: int = 7, granularity: Optional[str] = None) -> Tuple[str, str, int]:
+    """
+    Pick the rollup level that serves a request, as (level, unit, width).
+
+    A calendar granularity is served from its own level, one bucket per
+    period. An N-day request is served from the coarsest level whose buckets
+    tile it exactly: weeks when N is a multiple of 7, days otherwise. Buckets
+    are anchored at the start of the level period holding the first event.
+    """
+    if granularity is not None:
+        if granularity not in _LEVEL_UNITS:
+            raise ValueError(f"Unknown granularity: {granularity!r}")
+        unit, width = _LEVEL_UNITS[granularity]
+        return granularity, unit, width
+    if bucket_days < 1:
+        raise ValueError("bucket_days must be >= 1")
+    level = GRANULARITY_WEEK if bucket_days % 7 == 0 else GRANULARITY_DAY
+    return level, "D", bucket_days
+
+
+def bucket_counts_for_pair(
+    db: Session,
+    pair: str,
+    bucket_days: int = 7,
+    event_type: Optional[str] = None,
+    granularity: Optional[str] = None,
+) -> Optional[BucketSeries]:
+    """
+    Bucket a pair's events by summing the coarsest compatible level of the
+    event_bucket_counts pyramid (see resolve_level).
+    Returns None if the pair has no events.
+    """
+    level, unit, width = resolve_level(bucket_days, granularity)
+
+    t = EventBucketCount
+    stmt = (
+        select(t.bucket_start, func.sum(t.count))
+        .where(t.pair == pair, t.granularity == level)
+        .group_by(t.bucket_start)
+        .order_by(t.bucket_start)
+    )
+    if event_type is not None:
+        stmt = stmt.where(t.event_type == event_type)
+    rows = db.execute(stmt).all()
+    if not rows:
+        return None
+
+    return series_from_level_rows(
+        [r[0] for r in rows], [r[1] for r in rows], level=level, unit=unit, width=width
+    )
+
+
+def series_from_level_rows(
+    level_starts: List[datetime],
+    level_counts: List[int],
+    level: str,
+    unit: str,
+    width: int,
+) -> BucketSeries:
+    """Sum sorted rollup rows of one level into dense buckets of `width` units."""
+    stamps = np.array(level_starts, dtype=f"datetime64[{unit}]")
+    offsets = (stamps - stamps[0]).astype(np.int64) // width
+    counts = np.bincount(offsets, weights=np.asarray(level_counts, dtype=np.int64)).astype(np.int64)
+    starts = stamps[0] + np.arange(len(counts)) * width
+
+    return BucketSeries(bucket_starts=starts.astype("datetime64[s]"), counts=counts, granularity=level)
+
 
+def detect_bursts(series: BucketSeries, z_threshold: float = 1.5) -> List[Dict[str, Any]]:
+    """
+    Flag buckets whose count > mean + z_threshold * std.
+
+    Mean and std are taken over occupied buckets only, matching the original
+    pure-Python implementation.
+    """
+    occupied = np.flatnonzero(series.counts)
+    counts = series.counts[occupied].astype(float)
+    if counts.size == 0:
+        return []
+
+    mean = float(counts.mean())
+    std = float(counts.std(ddof=1)) if counts.size > 1 else 0.0
+
+    if std == 0:
+        # If std is zero, any count greater than mean is "burst"
+        flagged = counts > mean
+    else:
+        flagged = (counts - mean) / std >= z_threshold
+
+    return [
+        {
+            "bucket_start": series.bucket_starts[idx].astype(datetime).isoformat(),
+            "count": int(count),
+            "mean": mean,
+            "std": std,
+        }
+        for idx, count in zip(occupied[flagged], counts[flagged])
+    ]
+
+
+# Scales MAD to a std estimate under normality
+MAD_SCALE = 1.4826
+
+
+def rolling_baseline(counts: np.ndarray, window: int, robust: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per-bucket (baseline, scale) from the trailing `window` buckets, excluding
+    the bucket itself. Mean/std use prefix sums, median/MAD use a strided
+    window view; both are linear in the number of buckets. Entries with fewer
+    than two trailing buckets are NaN.
+    """
+    if window < 2:
+        raise ValueError("window must be >= 2")
+    x = counts.astype(float)
+    n = len(x)
+
+    if robust:
+        padded = np.concatenate([np.full(window, np.nan), x])
+        windows = sliding_window_view(padded[:-1], window)  # row i = x[i - window:i]
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN leading rows
+            baseline = np.nanmedian(windows, axis=1)
+            scale = MAD_SCALE * np.nanmedian(np.abs(windows - baseline[:, None]), axis=1)
+        size = np.minimum(np.arange(n), window)
+    else:
+        idx = np.arange(n)
+        lo = np.maximum(idx - window, 0)
+        size = idx - lo
+        c1 = np.concatenate([[0.0], np.cumsum(x)])
+        c2 = np.concatenate([[0.0], np.cumsum(x * x)])
+        s1 = c1[idx] - c1[lo]
+        s2 = c2[idx] - c2[lo]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            baseline = s1 / size
+            variance = np.maximum(s2 - s1 * s1 / size, 0.0) / (size - 1)
+        scale = np.sqrt(variance)
+
+    too_short = size < 2
+    baseline[too_short] = np.nan
+    scale[too_short] = np.nan
+    return baseline, scale
+
+
+def score_series(
+    series: BucketSeries,
+    z_threshold: float = 1.5,
+    window: Optional[int] = None,
+    robust: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Score every bucket (empty ones included) against a baseline.
+
+    Without a window the baseline is the global mean/std of occupied buckets,
+    as in detect_bursts; with one it is the trailing window (see
+    rolling_baseline). A bucket bursts when z >= z_threshold or, if the
+    scale is zero, when its count exceeds the baseline.
+    """
+    x = series.counts.astype(float)
+    if window is None:
+        occupied = x[x > 0]
+        mean = occupied.mean() if occupied.size else np.nan
+        std = occupied.std(ddof=1) if occupied.size > 1 else 0.0
+        baseline = np.full(len(x), mean)
+        scale = np.full(len(x), std)
+    else:
+        baseline, scale = rolling_baseline(series.counts, window, robust=robust)
 
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.where(scale > 0, (x - baseline) / scale, np.nan)
+    is_burst = np.where(scale > 0, z >= z_threshold, x > baseline)
+
+    def _num(v):
+        return None if np.isnan(v) else float(v)
+
+    return [
+        {
+            "bucket_start": start.astype(datetime).isoformat(),
+            "count": int(count),
+            "mean": _num(b),
+            "std": _num(sd),
+            "z": _num(zz),
+            "is_burst": bool(flag),
+        }
+        for start, count, b, sd, zz, flag in zip(series.bucket_starts, series.counts, baseline, scale, z, is_burst)
+    ]
+
+
+@versioned_cache
+def compute_bursts_all_pairs(
+    bucket_days: int = 7,
+    z_threshold: float = 1.5,
+    by_event_type: bool = True,
+    limit: Optional[int] = None,
+    granularity: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Batch burst detection for every pair (optionally split by event_type).
+
+    All series are read from one rollup level in a single query; re-bucketing
+    and mean/std per series are done with np.bincount over the occupied
+    buckets, using the same rule as compute_bursts_for_pair. Returns bursting
+    series ranked by peak z-score, at most `limit` of them (None for all).
+    """
+    if limit is not None and limit < 0:
+        raise ValueError(f"limit must be >= 0, got {limit}")
+    level, unit, width = resolve_level(bucket_days, granularity)
+
+    t = EventBucketCount
+    key_cols = [t.pair, t.event_type] if by_event_type else [t.pair]
+    stmt = (
+        select(*key_cols, t.bucket_start, func.sum(t.count))
+        .where(t.granularity == level)
+        .group_by(*key_cols, t.bucket_start)
+        .order_by(*key_cols, t.bucket_start)
+    )
+    db = SessionLocal()
+    try:
+        rows = db.execute(stmt).all()
+    finally:
+        db.close()
+
+    if not rows:
+        return []
+
+    # Rows arrive ordered by series then bucket, so the first row of each
+    # series is its anchor.
+    keys: Dict[tuple, int] = {}
+    anchor_rows: List[int] = []
+    group_ids = np.empty(len(rows), dtype=np.int64)
+    for i, row in enumerate(rows):
+        key = tuple(row[:len(key_cols)])
+        if key not in keys:
+            keys[key] = len(keys)
+            anchor_rows.append(i)
+        group_ids[i] = keys[key]
+    stamps = np.array([r[-2] for r in rows], dtype=f"datetime64[{unit}]")
+    level_counts = np.array([r[-1] for r in rows], dtype=float)
+
+    anchors = stamps[anchor_rows]
+    bucket_idx = (stamps - anchors[group_ids]).astype(np.int64) // width
+
+    # Collapse level rows into (series, bucket) cells
+    cells, cell_of_row = np.unique(np.stack([group_ids, bucket_idx]), axis=1, return_inverse=True)
+    counts = np.bincount(cell_of_row.ravel(), weights=level_counts)
+    group_ids, indexes = cells
+
+    n_groups = len(keys)
+    n_buckets = np.bincount(group_ids, minlength=n_groups)
+    means = np.bincount(group_ids, weights=counts, minlength=n_groups) / n_buckets
+    sq_dev = np.bincount(group_ids, weights=(counts - means[group_ids]) ** 2, minlength=n_groups)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        stds = np.where(n_buckets > 1, np.sqrt(sq_dev / (n_buckets - 1)), 0.0)
+        z = np.where(stds[group_ids] > 0, (counts - means[group_ids]) / stds[group_ids], np.nan)
+
+    # std == 0 means every occupied bucket equals the mean, so nothing bursts
+    flagged = np.flatnonzero(z >= z_threshold)
+    bucket_starts = (anchors[group_ids] + indexes * width).astype("datetime64[s]")
+
+    results: Dict[int, Dict[str, Any]] = {}
+    key_list = list(keys)
+    for i in flagged:
+        gid = int(group_ids[i])
+        entry = results.get(gid)
+        if entry is None:
+            entry = results[gid] = {
+                "pair": key_list[gid][0],
+                "mean": float(means[gid]),
+                "std": float(stds[gid]),
+                "max_z": float(z[i]),
+                "bursts": [],
+            }
+            if by_event_type:
+                entry["event_type"] = key_list[gid][1]
+        entry["max_z"] = max(entry["max_z"], float(z[i]))
+        entry["bursts"].append(
+            {
+                "bucket_start": bucket_starts[i].astype(datetime).isoformat(),
+                "count": int(counts[i]),
+                "z": float(z[i]),
+            }
+        )
+
+    ranked = sorted(
+        results.values(),
+        key=lambda r: (-r["max_z"], r["pair"], r.get("event_type", "")),
+    )
+    return ranked if limit is None else ranked[:limit]
+
+
+@versioned_cache
+def compute_scores_for_pair(
+    pair: str,
+    bucket_days: int = 7,
+    z_threshold: float = 1.5,
+    event_type: Optional[str] = None,
+    granularity: Optional[str] = None,
+    window: Optional[int] = None,
+    robust: bool = False,
+) -> List[Dict[str, Any]]:
+    """Per-bucket scores for a pair's whole timeline (see score_series)."""
+    db = SessionLocal()
+    try:
+        series = bucket_counts_for_pair(
+            db, pair, bucket_days=bucket_days, event_type=event_type, granularity=granularity
+        )
+    finally:
+        db.close()
+
+    if series is None:
+        return []
+
+    return score_series(series, z_threshold=z_threshold, window=window, robust=robust)
+
+
+@versioned_cache
 def compute_bursts_for_pair(
     pair: str,
     bucket_days: int = 7,
     z_threshold: float = 1.5,
+    event_type: Optional[str] = None,
+    granularity: Optional[str] = None,
+    window: Optional[int] = None,
+    robust: bool = False,
 ):
     """
     Simple burst detection:
-    - Filter events with meta_json["pair"] == pair
-    - Bucket counts by N-day windows
-    - Compute mean and std of bucket counts
+    - Read counts for meta_json["pair"] == pair from the rollup pyramid
+    - Bucket counts by N-day windows (or calendar weeks/months/quarters)
+    - Compute mean and std of bucket counts (globally, or over the trailing
+      `window` buckets; median/MAD when robust)
     - Return buckets whose count > mean + z_threshold * std
     """
+    if window is not None:
+        scores = compute_scores_for_pair(
+            pair,
+            bucket_days=bucket_days,
+            z_threshold=z_threshold,
+            event_type=event_type,
+            granularity=granularity,
+            window=window,
+            robust=robust,
+        )
+        return [s for s in scores if s["is_burst"]]
+
     db = SessionLocal()
     try:
-        q = db.query(Event).filter(Event.meta_json["pair"].as_string() == pair)
-        events = q.all()
+        series = bucket_counts_for_pair(
+            db, pair, bucket_days=bucket_days, event_type=event_type, granularity=granularity
+        )
     finally:
         db.close()
 
-    if not events:
+    if series is None:
         return []
 
-    # Sort by time
-    events.sort(key=lambda e: e.event_time)
+    return detect_bursts(series, z_threshold=z_threshold)
 
-    # Determine bucket start times
-    bucket_size = timedelta(days=bucket_days)
-    buckets = defaultdict(int)
 
-    start = events[0].event_time
-    for ev in events:
-        delta = ev.event_time - start
-        bucket_index = delta // bucket_size
-        bucket_start = start + bucket_index * bucket_size
-        buckets[bucket_start] += 1
+@versioned_cache
+def compute_kleinberg_bursts_for_pair(
+    pair: str,
+    s: float = 2.0,
+    gamma: float = 1.0,
+    n_states: int = 2,
+    event_type: Optional[str] = None,
+    max_lag: Optional[int] = 1024,
+) -> List[Dict[str, Any]]:
+    """
+    Kleinberg burst detection over a pair's inter-arrival gaps.
 
-    counts = list(buckets.values())
-    mean = sum(counts) / len(counts)
-    if len(counts) > 1:
-        variance = sum((c - mean) ** 2 for c in counts) / (len(counts) - 1)
-    else:
-        variance = 0.0
-    std = variance ** 0.5
-
-    bursts = []
-    for bucket_start, count in buckets.items():
-        if std == 0:
-            # If std is zero, any count greater than mean is "burst"
-            is_burst = count > mean
-        else:
-            z = (count - mean) / std
-            is_burst = z >= z_threshold
-        if is_burst:
-            bursts.append(
-                {
-                    "bucket_start": bucket_start.isoformat(),
-                    "count": count,
-                    "mean": mean,
-                    "std": std,
-                }
-            )
-
-    bursts.sort(key=lambda b: b["bucket_start"])
-    return bursts
+    Count and span come from one aggregate query; event times are then
+    streamed in order off the (pair, event_time) index with yield_per through
+    the automaton, so memory is bounded by max_lag rather than the number of
+    events. Raises ValueError for invalid s/gamma/n_states.
+    """
+    check_params(s, gamma, n_states)
+    where = [Event.pair == pair, Event.event_time.isnot(None)]
+    if event_type is not None:
+        where.append(Event.event_type == event_type)
+
+    db = SessionLocal()
+    try:
+        n_events, first, last = db.execute(
+            select(func.count(), func.min(Event.event_time), func.max(Event.event_time)).where(*where)
+        ).one()
+        if n_events < 2:
+            return []
+
+        times = db.execute(
+            select(Event.event_time)
+            .where(*where)
+            .order_by(Event.event_time)
+            .execution_options(yield_per=10_000)
+        ).scalars()
+        bursts = kleinberg_bursts(
+            times,
+            n_events=n_events,
+            span_seconds=(last - first).total_seconds(),
+            s=s,
+            gamma=gamma,
+            n_states=n_states,
+            max_lag=max_lag,
+        )
+        return [b.as_dict() for b in bursts]
+    finally:
+        db.close()
 
 
 def main():
@@ -0,0 +1,191 @@
+"""
+Analytics benchmark: synthetic load, burst latency and detection recall.
+
+For each scale (total synthetic events) this bulk-loads generated events,
+times compute_bursts_for_pair directly and through GET /api/analytics/bursts
+(cold = cache cleared, warm = cache hit), times the batch sweep, and checks
+how many injected bursts were flagged.
+
+Synthetic rows use event_type="bench" and are removed before each scale and
+at the end (unless --keep), so real events are left alone.
+
+    python -m backend.app.analytics.benchmark --scales 10000,100000,1000000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+import numpy as np
+from sqlalchemy import delete
+
+from backend.app.db.session import SessionLocal
+from backend.app.db.schema import Event, EventBucketCount
+from backend.app.analytics.anomaly import compute_bursts_all_pairs, compute_bursts_for_pair
+from backend.app.analytics.cache import result_cache
+from backend.app.analytics.event_test_data import InjectedBurst, generate_synthetic_events
+from backend.app.analytics.rollup import bulk_insert_events, mark_events_written
+
+BENCH_EVENT_TYPE = "bench"
+
+
+def clear_bench_events() -> None:
+    db = SessionLocal()
+    try:
+        db.execute(delete(Event).where(Event.event_type == BENCH_EVENT_TYPE))
+        db.execute(delete(EventBucketCount).where(EventBucketCount.event_type == BENCH_EVENT_TYPE))
+        mark_events_written(db)
+        db.commit()
+    finally:
+        db.close()
+
+
+def load_bench_events(rows) -> int:
+    db = SessionLocal()
+    try:
+        n = bulk_insert_events(db, rows)
+        db.commit()
+        return n
+    finally:
+        db.close()
+
+
+def latency_stats(fn: Callable[[], object], repeats: int) -> Dict[str, float]:
+    timings: List[float] = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+    ms = np.array(timings) * 1000
+    return {
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "qps": repeats / float(ms.sum() / 1000),
+    }
+
+
+def recall(injected: List[InjectedBurst], bucket_days: int, z_threshold: float) -> float:
+    """Share of injected bursts overlapped by at least one flagged bucket."""
+    compute = compute_bursts_for_pair.__wrapped__  # bypass the result cache
+    bucket = timedelta(days=bucket_days)
+    flagged: Dict[str, List[datetime]] = {}
+    hit = 0
+    for burst in injected:
+        if burst.pair not in flagged:
+            flagged[burst.pair] = [
+                datetime.fromisoformat(b["bucket_start"])
+                for b in compute(burst.pair, bucket_days=bucket_days, z_threshold=z_threshold, event_type=BENCH_EVENT_TYPE)
+            ]
+        if any(start < burst.end and start + bucket > burst.start for start in flagged[burst.pair]):
+            hit += 1
+    return hit / len(injected) if injected else float("nan")
+
+
+def run_scale(
+    total_events: int,
+    n_pairs: int,
+    span_days: int,
+    bucket_days: int,
+    z_threshold: float,
+    queries: int,
+    seed: int,
+) -> Dict[str, object]:
+    base_rate = total_events / (n_pairs * span_days)
+    injected, rows = generate_synthetic_events(
+        n_pairs=n_pairs,
+        span_days=span_days,
+        base_rate=base_rate,
+        event_type=BENCH_EVENT_TYPE,
+        seed=seed,
+    )
+
+    clear_bench_events()
+    t0 = time.perf_counter()
+    loaded = load_bench_events(rows)
+    load_s = time.perf_counter() - t0
+
+    pairs = sorted({b.pair for b in injected})
+    rnd = random.Random(seed)
+    compute = compute_bursts_for_pair.__wrapped__
+
+    direct = latency_stats(
+        lambda: compute(rnd.choice(pairs), bucket_days=bucket_days, z_threshold=z_threshold),
+        queries,
+    )
+
+    from fastapi.testclient import TestClient  # needs httpx
+    from backend.app.main import app
+
+    client = TestClient(app)
+
+    def _get(pair: str):
+        resp = client.get(
+            "/api/analytics/bursts",
+            params={"pair": pair, "bucket_days": bucket_days, "z_threshold": z_threshold},
+        )
+        resp.raise_for_status()
+
+    def _cold():
+        result_cache.clear()
+        _get(rnd.choice(pairs))
+
+    endpoint_cold = latency_stats(_cold, queries)
+    warm_pair = pairs[0]
+    _get(warm_pair)
+    endpoint_warm = latency_stats(lambda: _get(warm_pair), queries)
+
+    t0 = time.perf_counter()
+    compute_bursts_all_pairs.__wrapped__(bucket_days=bucket_days, z_threshold=z_threshold)
+    batch_s = time.perf_counter() - t0
+
+    return {
+        "events": loaded,
+        "load_rows_per_s": loaded / load_s if load_s else float("inf"),
+        "direct": direct,
+        "endpoint_cold": endpoint_cold,
+        "endpoint_warm": endpoint_warm,
+        "batch_s": batch_s,
+        "recall": recall(injected, bucket_days, z_threshold),
+    }
+
+
+def _fmt(stats: Dict[str, float]) -> str:
+    return f"p50={stats['p50_ms']:.2f}ms p99={stats['p99_ms']:.2f}ms qps={stats['qps']:.0f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark burst analytics on synthetic events")
+    parser.add_argument("--scales", type=str, default="10000,100000,1000000", help="Comma-separated event totals")
+    parser.add_argument("--pairs", type=int, default=100)
+    parser.add_argument("--span-days", type=int, default=730)
+    parser.add_argument("--bucket-days", type=int, default=7)
+    parser.add_argument("--z-threshold", type=float, default=1.5)
+    parser.add_argument("--queries", type=int, default=200, help="Timed requests per measurement")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="Leave the last scale's events in the DB")
+    args = parser.parse_args()
+
+    try:
+        for scale in (int(s) for s in args.scales.split(",")):
+            r = run_scale(
+                total_events=scale,
+                n_pairs=args.pairs,
+                span_days=args.span_days,
+                bucket_days=args.bucket_days,
+                z_threshold=args.z_threshold,
+                queries=args.queries,
+                seed=args.seed,
+            )
+            print(f"[bench] scale={scale} events={r['events']} load={r['load_rows_per_s']:.0f} rows/s")
+            print(f"[bench]   compute_bursts_for_pair   {_fmt(r['direct'])}")
+            print(f"[bench]   /api/analytics/bursts cold {_fmt(r['endpoint_cold'])}")
+            print(f"[bench]   /api/analytics/bursts warm {_fmt(r['endpoint_warm'])}")
+            print(f"[bench]   batch all pairs {r['batch_s'] * 1000:.1f}ms  recall={r['recall']:.3f}")
+    finally:
+        if not args.keep:
+            clear_bench_events()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Versioned LRU cache for analytics results.
+
+Keys include the current "events" data version (see
+backend.app.analytics.rollup.mark_events_written), so any event write makes
+older entries unreachable; they then age out of the LRU. Cached values are
+shared between callers and must not be mutated.
+
+The version is read from the database at most once per
+settings.analytics_version_ttl seconds, so a hit costs no query. Commits in
+this process refresh it at once; writes from other processes show up
+within the TTL.
+"""
+import functools
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+from backend.app.config.settings import settings
+from backend.app.db.session import SessionLocal
+from backend.app.analytics.rollup import current_data_version, local_bump_count
+
+
+class ResultCache:
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        value = compute()
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else None,
+            }
+
+
+result_cache = ResultCache(maxsize=settings.analytics_cache_size)
+
+
+_version: Dict[str, Any] = {"value": None, "read_at": 0.0, "local_bumps": None}
+_version_lock = threading.Lock()
+
+
+def _data_version() -> int:
+    now = time.monotonic()
+    local_bumps = local_bump_count()
+    with _version_lock:
+        if (
+            _version["value"] is not None
+            and _version["local_bumps"] == local_bumps
+            and now - _version["read_at"] < settings.analytics_version_ttl
+        ):
+            return _version["value"]
+
+    db = SessionLocal()
+    try:
+        value = current_data_version(db)
+    finally:
+        db.close()
+    with _version_lock:
+        _version.update(value=value, read_at=now, local_bumps=local_bumps)
+    return value
+
+
+def versioned_cache(fn: Callable) -> Callable:
+    """Memoize fn in result_cache, keyed by its arguments and the data version."""
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = (fn.__qualname__, args, tuple(sorted(kwargs.items())), _data_version())
+        return result_cache.get_or_compute(key, lambda: fn(*args, **kwargs))
+
+    return wrapper
@@ -1,12 +1,18 @@
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Tuple
+
+import numpy as np
 
 from backend.app.db.session import SessionLocal
-from backend.app.db.schema import Event
+from backend.app.db.schema import Event, EventBucketCount
 
 def seed_test_events():
     db = SessionLocal()
     try:
+        # Bulk delete bypasses the rollup hook, so clear the rollup alongside it
         db.query(Event).delete()
+        db.query(EventBucketCount).delete()
 
         base = datetime(2020, 1, 1, tzinfo=timezone.utc)
 
@@ -45,6 +51,63 @@ def seed_test_events():
         db.close()
 
 
+@dataclass
+class InjectedBurst:
+    pair: str
+    start: datetime
+    end: datetime
+
+
+def generate_synthetic_events(
+    n_pairs: int = 100,
+    span_days: int = 730,
+    base_rate: float = 1.0,
+    bursts_per_pair: int = 2,
+    burst_days: int = 7,
+    burst_multiplier: float = 8.0,
+    event_type: str = "bench",
+    seed: int = 0,
+    start: datetime = datetime(2020, 1, 1),
+) -> Tuple[List[InjectedBurst], Iterator[Dict[str, Any]]]:
+    """
+    Synthetic Poisson event streams for benchmarking.
+
+    Each pair gets a baseline of `base_rate` events/day over `span_days`, plus
+    `bursts_per_pair` windows of `burst_days` at `burst_multiplier` times the
+    base rate. Returns the injected bursts (known up front) and a lazy
+    generator of event row dicts suitable for rollup.bulk_insert_events.
+    """
+    rng = np.random.default_rng(seed)
+    pairs = [f"bench-{i:05d}" for i in range(n_pairs)]
+    injected: List[InjectedBurst] = []
+    burst_offsets: Dict[str, np.ndarray] = {}
+    for pair in pairs:
+        offsets = rng.integers(0, span_days - burst_days, size=bursts_per_pair)
+        burst_offsets[pair] = offsets
+        for off in offsets:
+            b_start = start + timedelta(days=int(off))
+            injected.append(InjectedBurst(pair, b_start, b_start + timedelta(days=burst_days)))
+
+    def _rows() -> Iterator[Dict[str, Any]]:
+        span_s = span_days * 86400
+        for pair in pairs:
+            n_base = rng.poisson(base_rate * span_days)
+            seconds = [rng.uniform(0, span_s, size=n_base)]
+            for off in burst_offsets[pair]:
+                n_extra = rng.poisson(base_rate * (burst_multiplier - 1) * burst_days)
+                seconds.append(off * 86400 + rng.uniform(0, burst_days * 86400, size=n_extra))
+            for sec in np.sort(np.concatenate(seconds)):
+                yield {
+                    "document_id": None,
+                    "event_type": event_type,
+                    "event_time": start + timedelta(seconds=float(sec)),
+                    "description": None,
+                    "meta_json": {"pair": pair},
+                }
+
+    return injected, _rows()
+
+
 def main():
     seed_test_events()
 
@@ -0,0 +1,25 @@
+"""
+Dedicated executor for analytics calls made from async routes.
+
+Burst computations are sync (numpy plus a blocking session) and can take a
+while, so async routes hand them to this pool instead of running them on the
+event loop or in Starlette's shared threadpool, where they would crowd out
+the I/O-bound routes. Threads rather than processes, so results still land
+in the shared result_cache.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable
+
+from backend.app.config.settings import settings
+
+analytics_executor = ThreadPoolExecutor(
+    max_workers=settings.analytics_workers,
+    thread_name_prefix="analytics",
+)
+
+
+async def run_analytics(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(analytics_executor, partial(fn, *args, **kwargs))
@@ -0,0 +1,182 @@
+"""
+Kleinberg burst automaton over inter-arrival gaps.
+
+State i emits gaps from an exponential with rate base_rate * s**i; moving up
+one level costs gamma * ln(n), moving down is free. The cheapest state
+sequence is found with a Viterbi pass, O(n * states**2).
+
+In streaming mode (max_lag set) backpointers are only kept for undecided gaps:
+whenever max_lag of them pile up, every survivor path is traced back and the
+prefix they all agree on is emitted. That prefix is exactly what the full
+Viterbi pass would choose, so memory stays bounded without changing results
+unless the paths fail to merge within the window (then the best path's first
+half is committed).
+"""
+import math
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Deque, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+
+@dataclass
+class KleinbergBurst:
+    level: int
+    start: datetime
+    end: datetime
+    count: int
+
+    def as_dict(self):
+        return {
+            "bucket_start": self.start.isoformat(),
+            "end": self.end.isoformat(),
+            "level": self.level,
+            "count": self.count,
+        }
+
+
+def check_params(s: float, gamma: float, n_states: int) -> None:
+    """Raise ValueError unless the automaton is well defined (rates grow with each state)."""
+    if n_states < 2:
+        raise ValueError(f"Kleinberg needs at least 2 states, got {n_states}")
+    if not s > 1:
+        raise ValueError(f"Kleinberg rate ratio s must be > 1, got {s}")
+    if not gamma >= 0:
+        raise ValueError(f"Kleinberg gamma must be >= 0, got {gamma}")
+
+
+def _transition_costs(n_states: int, gamma: float, n_events: int) -> np.ndarray:
+    # tau[i, j]: cost of moving from state i to state j
+    up = gamma * math.log(max(n_events, 2))
+    levels = np.arange(n_states)
+    return np.maximum(levels[None, :] - levels[:, None], 0) * up
+
+
+def _trace(backptrs: List[np.ndarray], state: int, upto: int) -> List[int]:
+    """States for positions 0..upto, tracing back from `state` at position upto."""
+    states = [state]
+    for t in range(upto, 0, -1):
+        state = int(backptrs[t][state])
+        states.append(state)
+    states.reverse()
+    return states
+
+
+def _converged_prefix(backptrs: List[np.ndarray], cost: np.ndarray) -> List[int]:
+    """
+    Trace every current state back through the window and return the decided
+    prefix: positions up to where all survivor paths have merged.
+    """
+    current = np.arange(len(cost))
+    for t in range(len(backptrs) - 1, 0, -1):
+        current = backptrs[t][current]
+        if (current == current[0]).all():
+            return _trace(backptrs, int(current[0]), t - 1)
+    # Paths never merged inside the window: commit half of the best path
+    best = _trace(backptrs, int(cost.argmin()), len(backptrs) - 1)
+    return best[: max(1, len(best) // 2)]
+
+
+def viterbi_states(
+    gaps: Iterable[float],
+    base_rate: float,
+    n_events: int,
+    s: float = 2.0,
+    gamma: float = 1.0,
+    n_states: int = 2,
+    max_lag: Optional[int] = 1024,
+) -> Iterator[int]:
+    """
+    Yield the optimal automaton state for each gap (seconds), in order.
+
+    base_rate is the expected events per second of the quiet state; n_events
+    sets the ln(n) transition cost. max_lag=None keeps every backpointer and
+    decodes once at the end. Raises ValueError for invalid s/gamma/n_states.
+    """
+    check_params(s, gamma, n_states)
+    alphas = base_rate * s ** np.arange(n_states)
+    log_alphas = np.log(alphas)
+    tau = _transition_costs(n_states, gamma, n_events)
+    columns = np.arange(n_states)
+
+    cost = np.full(n_states, np.inf)
+    cost[0] = 0.0
+    backptrs: List[np.ndarray] = []
+
+    for gap in gaps:
+        total = cost[:, None] + tau
+        bp = total.argmin(axis=0)
+        cost = total[bp, columns] + alphas * gap - log_alphas
+        cost -= cost.min()
+        backptrs.append(bp)
+
+        if max_lag and len(backptrs) >= max_lag:
+            decided = _converged_prefix(backptrs, cost)
+            yield from decided
+            del backptrs[: len(decided)]
+
+    if backptrs:
+        yield from _trace(backptrs, int(cost.argmin()), len(backptrs) - 1)
+
+
+def _gaps(times: Iterable[datetime], seen: Deque[datetime]) -> Iterator[float]:
+    """Yield inter-arrival gaps in seconds, appending every time read to `seen`."""
+    prev = None
+    for t in times:
+        seen.append(t)
+        if prev is not None:
+            yield max((t - prev).total_seconds(), 0.0)
+        prev = t
+
+
+def kleinberg_bursts(
+    times: Iterable[datetime],
+    n_events: int,
+    span_seconds: float,
+    s: float = 2.0,
+    gamma: float = 1.0,
+    n_states: int = 2,
+    max_lag: Optional[int] = 1024,
+) -> Iterator[KleinbergBurst]:
+    """
+    Stream bursts (maximal runs of gaps above the base state) from sorted
+    event times. n_events and span_seconds describe the whole series and fix
+    the base rate up front, so `times` can be a one-pass generator.
+    Raises ValueError for invalid s/gamma/n_states.
+    """
+    check_params(s, gamma, n_states)
+    if n_events < 2 or span_seconds <= 0:
+        return
+
+    base_rate = (n_events - 1) / span_seconds
+    # Times not yet matched to a decided gap; bounded by max_lag
+    pending: Deque[datetime] = deque()
+    states = viterbi_states(
+        _gaps(times, pending),
+        base_rate=base_rate,
+        n_events=n_events,
+        s=s,
+        gamma=gamma,
+        n_states=n_states,
+        max_lag=max_lag,
+    )
+
+    run: Optional[KleinbergBurst] = None
+    for state in states:
+        gap_start = pending.popleft()
+        gap_end = pending[0]
+        if state > 0:
+            if run is None:
+                run = KleinbergBurst(level=state, start=gap_start, end=gap_end, count=2)
+            else:
+                run.level = max(run.level, state)
+                run.end = gap_end
+                run.count += 1
+        elif run is not None:
+            yield run
+            run = None
+
+    if run is not None:
+        yield run
@@ -0,0 +1,387 @@
+"""
+Incrementally maintained rollup of event counts (the event_bucket_counts table).
+
+Counts are kept as a pyramid of calendar levels (day, ISO week, month,
+quarter). Every ORM flush that inserts, deletes or re-times an Event carrying
+meta_json["pair"] adjusts the matching rollup rows at every level in the same
+transaction, so burst queries can read per-bucket counts instead of scanning
+events. backend.app.db.session registers these hooks on every Session.
+
+Such a flush also marks the session, and the "events" row of data_versions
+(which result caches key on) is bumped once when its transaction commits, so
+concurrent loaders hold that row's lock only for the commit itself. Writes
+that bypass the ORM unit of work (Core inserts, bulk deletes) must call
+apply_deltas() and mark_events_written() themselves, go through
+bulk_insert_events() / merge_events(), or run the backfill afterwards:
+
+    python -m backend.app.analytics.rollup
+"""
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, event, func, insert, inspect, literal, select, text
+from sqlalchemy.orm import Session
+
+from backend.app.db.copy import copy_rows
+from backend.app.db.upsert import dialect_insert
+from backend.app.db.schema import DataVersion, Event, EventBucketCount
+
+GRANULARITY_DAY = "day"
+GRANULARITY_WEEK = "week"
+GRANULARITY_MONTH = "month"
+GRANULARITY_QUARTER = "quarter"
+GRANULARITIES = (GRANULARITY_DAY, GRANULARITY_WEEK, GRANULARITY_MONTH, GRANULARITY_QUARTER)
+EVENTS_VERSION = "events"
+UPSERT_CHUNK = 1000
+BULK_INSERT_CHUNK = 10_000
+STAGING_COLUMNS = ("source_key", "event_type", "event_time", "description", "meta_json")
+EVENTS_WRITTEN = "events_written"
+EVENTS_BUMPED = "events_bumped"
+
+# Commits in this process that bumped the events version, so readers here
+# can see their own writes without waiting for a version re-read
+_local_bumps = 0
+_local_bumps_lock = threading.Lock()
+
+
+def series_key(meta_json: Any, event_type: Optional[str]) -> Optional[Tuple[str, str]]:
+    """Return the (pair, event_type) series an event belongs to, or None."""
+    if not isinstance(meta_json, dict):
+        return None
+    pair = meta_json.get("pair")
+    if not pair:
+        return None
+    return str(pair), event_type or ""
+
+
+def bucket_start(event_time: datetime, granularity: str = GRANULARITY_DAY) -> datetime:
+    """
+    Floor a timestamp to the start of its rollup bucket (timezone dropped).
+    Matches Postgres date_trunc: weeks start on Monday.
+    """
+    day = datetime(event_time.year, event_time.month, event_time.day)
+    if granularity == GRANULARITY_DAY:
+        return day
+    if granularity == GRANULARITY_WEEK:
+        return day - timedelta(days=day.weekday())
+    if granularity == GRANULARITY_MONTH:
+        return day.replace(day=1)
+    if granularity == GRANULARITY_QUARTER:
+        return day.replace(month=3 * ((day.month - 1) // 3) + 1, day=1)
+    raise ValueError(f"Unknown granularity: {granularity!r}")
+
+
+def add_event(
+    deltas: Counter,
+    meta_json: Any,
+    event_type: Optional[str],
+    event_time: Optional[datetime],
+    sign: int = 1,
+) -> None:
+    """Record +1/-1 for one event at every level, keyed by (pair, event_type, granularity, bucket_start)."""
+    key = series_key(meta_json, event_type)
+    if key is None or event_time is None:
+        return
+    pair, etype = key
+    for granularity in GRANULARITIES:
+        deltas[(pair, etype, granularity, bucket_start(event_time, granularity))] += sign
+
+
+def apply_deltas(conn, deltas: Counter) -> None:
+    """
+    Upsert count deltas into event_bucket_counts and drop buckets that fall to zero.
+    `conn` may be a Connection or a Session.
+    """
+    rows = [
+        {"pair": pair, "event_type": etype, "granularity": gran, "bucket_start": start, "count": n}
+        for (pair, etype, gran, start), n in deltas.items()
+        if n
+    ]
+    if not rows:
+        return
+    # Fixed upsert order, so concurrent writers lock buckets in the same order
+    rows.sort(key=lambda r: (r["pair"] or "", r["event_type"] or "", r["granularity"], r["bucket_start"]))
+
+    table = EventBucketCount.__table__
+    bind = conn.connection() if isinstance(conn, Session) else conn
+    insert = dialect_insert(bind)
+    for i in range(0, len(rows), UPSERT_CHUNK):
+        stmt = insert(table).values(rows[i:i + UPSERT_CHUNK])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["pair", "event_type", "granularity", "bucket_start"],
+            set_={"count": table.c.count + stmt.excluded.count},
+        )
+        bind.execute(stmt)
+
+    touched_pairs = {r["pair"] for r in rows}
+    bind.execute(delete(table).where(table.c.pair.in_(touched_pairs), table.c.count <= 0))
+
+
+def bump_data_version(conn, name: str = EVENTS_VERSION) -> None:
+    """Increment a data_versions counter; `conn` may be a Connection or a Session."""
+    table = DataVersion.__table__
+    bind = conn.connection() if isinstance(conn, Session) else conn
+    stmt = dialect_insert(bind)(table).values(name=name, version=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["name"],
+        set_={"version": table.c.version + 1},
+    )
+    bind.execute(stmt)
+
+
+def mark_events_written(db: Session) -> None:
+    """Bump the events data version once, when db's current transaction commits."""
+    db.info[EVENTS_WRITTEN] = True
+
+
+def local_bump_count() -> int:
+    """Number of commits in this process that bumped the events data version."""
+    return _local_bumps
+
+
+def current_data_version(db: Session, name: str = EVENTS_VERSION) -> int:
+    version = db.execute(select(DataVersion.version).where(DataVersion.name == name)).scalar()
+    return version or 0
+
+
+def _previous_value(state, attr: str):
+    hist = state.attrs[attr].history
+    if hist.deleted:
+        return hist.deleted[0]
+    return getattr(state.object, attr)
+
+
+def _maintain_rollup(session: Session, flush_context) -> None:
+    # new/dirty/deleted still reflect the pre-flush state here
+    deltas: Counter = Counter()
+    events_written = False
+
+    for obj in session.new:
+        if isinstance(obj, Event):
+            events_written = True
+            add_event(deltas, obj.meta_json, obj.event_type, obj.event_time, +1)
+
+    for obj in session.deleted:
+        if isinstance(obj, Event):
+            events_written = True
+            state = inspect(obj)
+            add_event(
+                deltas,
+                _previous_value(state, "meta_json"),
+                _previous_value(state, "event_type"),
+                _previous_value(state, "event_time"),
+                -1,
+            )
+
+    for obj in session.dirty:
+        if not isinstance(obj, Event):
+            continue
+        state = inspect(obj)
+        tracked = ("meta_json", "event_type", "event_time")
+        if not any(state.attrs[a].history.has_changes() for a in tracked):
+            continue
+        events_written = True
+        add_event(deltas, *(_previous_value(state, a) for a in tracked), -1)
+        add_event(deltas, obj.meta_json, obj.event_type, obj.event_time, +1)
+
+    if deltas:
+        apply_deltas(session, deltas)
+    if events_written:
+        mark_events_written(session)
+
+
+def _bump_on_commit(session: Session) -> None:
+    # Flush first: commit only flushes pending objects after this hook runs
+    session.flush()
+    if session.info.pop(EVENTS_WRITTEN, False):
+        bump_data_version(session)
+        session.info[EVENTS_BUMPED] = True
+
+
+def _count_local_bump(session: Session) -> None:
+    global _local_bumps
+    if session.info.pop(EVENTS_BUMPED, False):
+        with _local_bumps_lock:
+            _local_bumps += 1
+
+
+def _forget_writes(session: Session) -> None:
+    session.info.pop(EVENTS_WRITTEN, None)
+    session.info.pop(EVENTS_BUMPED, None)
+
+
+SESSION_HOOKS = (
+    ("after_flush", _maintain_rollup),
+    ("before_commit", _bump_on_commit),
+    ("after_commit", _count_local_bump),
+    ("after_rollback", _forget_writes),
+)
+
+
+def register_session_hooks(target=Session) -> None:
+    """
+    Attach the rollup/data version hooks to target (a Session class or
+    sessionmaker). backend.app.db.session does this for every Session, so
+    ORM writers need not import this module.
+    """
+    for name, fn in SESSION_HOOKS:
+        if not event.contains(target, name, fn):
+            event.listen(target, name, fn)
+
+
+def bulk_insert_events(db: Session, rows: Iterable[Dict[str, Any]], chunk_size: int = BULK_INSERT_CHUNK) -> int:
+    """
+    Insert event dicts (Event column names as keys) with executemany in
+    chunks, applying rollup deltas per chunk; the data version is bumped on commit.
+    Does not commit. Returns the number of rows inserted.
+    """
+    inserted = 0
+    chunk: List[Dict[str, Any]] = []
+
+    def _flush_chunk():
+        deltas: Counter = Counter()
+        for row in chunk:
+            add_event(deltas, row.get("meta_json"), row.get("event_type"), row.get("event_time"), +1)
+        db.execute(insert(Event), chunk)
+        apply_deltas(db, deltas)
+        mark_events_written(db)
+
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            _flush_chunk()
+            inserted += len(chunk)
+            chunk = []
+    if chunk:
+        _flush_chunk()
+        inserted += len(chunk)
+    return inserted
+
+
+def _merge_events_postgres(db: Session, rows: Iterable[Dict[str, Any]], chunk_size: int) -> int:
+    """
+    COPY rows into a transaction-scoped staging table, then move the ones
+    with an unseen source_key into events with a single INSERT ... SELECT.
+    Rollup deltas come back pre-aggregated per (pair, event_type, day).
+    """
+    db.execute(text(
+        "CREATE TEMP TABLE events_staging ("
+        "source_key VARCHAR NOT NULL, event_type VARCHAR, event_time TIMESTAMP, "
+        "description TEXT, meta_json JSON) ON COMMIT DROP"
+    ))
+    copy_rows(db, "events_staging", STAGING_COLUMNS, rows, chunk_size=chunk_size)
+
+    merged = db.execute(text(
+        "WITH ins AS ("
+        " INSERT INTO events (source_key, event_type, event_time, description, meta_json)"
+        " SELECT source_key, event_type, event_time, description, meta_json FROM events_staging"
+        " ON CONFLICT (source_key) DO NOTHING"
+        " RETURNING pair, event_type, event_time)"
+        " SELECT pair, event_type, date_trunc('day', event_time), count(*) FROM ins GROUP BY 1, 2, 3"
+    )).all()
+    db.execute(text("DROP TABLE events_staging"))
+
+    deltas: Counter = Counter()
+    for pair, event_type, day, n in merged:
+        if pair and day is not None:
+            for granularity in GRANULARITIES:
+                deltas[(pair, event_type or "", granularity, bucket_start(day, granularity))] += n
+    apply_deltas(db, deltas)
+    return sum(n for *_, n in merged)
+
+
+def _merge_events_generic(db: Session, rows: Iterable[Dict[str, Any]], chunk_size: int) -> int:
+    """Fallback for databases without COPY: drop known keys per chunk, then bulk insert."""
+
+    def _new_rows() -> Iterable[Dict[str, Any]]:
+        seen: set = set()
+        chunk: List[Dict[str, Any]] = []
+
+        def _filter(chunk):
+            keys = [r["source_key"] for r in chunk]
+            seen.update(db.execute(select(Event.source_key).where(Event.source_key.in_(keys))).scalars())
+            for r in chunk:
+                if r["source_key"] not in seen:
+                    seen.add(r["source_key"])
+                    yield r
+
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= UPSERT_CHUNK:
+                yield from _filter(chunk)
+                chunk = []
+        if chunk:
+            yield from _filter(chunk)
+
+    return bulk_insert_events(db, _new_rows(), chunk_size=chunk_size)
+
+
+def merge_events(db: Session, rows: Iterable[Dict[str, Any]], chunk_size: int = BULK_INSERT_CHUNK) -> int:
+    """
+    Idempotent bulk load: insert event dicts whose source_key is not in
+    events yet (rows must carry source_key). On Postgres rows are streamed
+    with COPY through a staging table; rollup deltas are applied and the
+    data version bumped on commit either way. Does not commit. Returns rows inserted.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        inserted = _merge_events_postgres(db, rows, chunk_size)
+    else:
+        inserted = _merge_events_generic(db, rows, chunk_size)
+    if inserted:
+        mark_events_written(db)
+    return inserted
+
+
+def _stream_event_deltas(db: Session) -> Counter:
+    deltas: Counter = Counter()
+    stmt = select(Event.meta_json, Event.event_type, Event.event_time).execution_options(yield_per=10_000)
+    for meta_json, event_type, event_time in db.execute(stmt):
+        add_event(deltas, meta_json, event_type, event_time, +1)
+    return deltas
+
+
+def rebuild_rollup(db: Session) -> int:
+    """
+    Backfill: recompute event_bucket_counts from the events table.
+    Returns the number of rollup rows written.
+    """
+    table = EventBucketCount.__table__
+    db.execute(delete(table))
+
+    if db.get_bind().dialect.name == "postgresql":
+        etype = func.coalesce(Event.event_type, "")
+        for granularity in GRANULARITIES:
+            start = func.date_trunc(granularity, Event.event_time)
+            agg = (
+                select(Event.pair, etype, literal(granularity), start, func.count())
+                .where(Event.pair.isnot(None), Event.pair != "", Event.event_time.isnot(None))
+                .group_by(Event.pair, etype, start)
+            )
+            db.execute(
+                table.insert().from_select(
+                    ["pair", "event_type", "granularity", "bucket_start", "count"], agg
+                )
+            )
+    else:
+        apply_deltas(db, _stream_event_deltas(db))
+
+    mark_events_written(db)
+    db.commit()
+    return db.query(EventBucketCount).count()
+
+
+def main():
+    from backend.app.db.session import SessionLocal  # that module imports this one
+
+    db = SessionLocal()
+    try:
+        n = rebuild_rollup(db)
+    finally:
+        db.close()
+    print(f"Rebuilt event_bucket_counts: {n} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Full anomaly sweep over every (pair, event_type) series.
+
+The series space is split into shards of pairs. The parent process pulls each
+shard's rollup rows in one query and hands them to a ProcessPoolExecutor for
+scoring; results come back in shard order and are written to burst_results,
+so the output is identical for any worker count.
+
+    python -m backend.app.analytics.sweep --workers 8 --bucket-days 7
+"""
+import argparse
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+
+from backend.app.db.session import SessionLocal
+from backend.app.db.schema import BurstResult, EventBucketCount
+from backend.app.analytics.anomaly import resolve_level, score_series, series_from_level_rows
+
+# (pair, event_type, [bucket_start...], [count...])
+SeriesRows = Tuple[str, str, List[datetime], List[int]]
+
+
+def run_key(
+    bucket_days: int,
+    z_threshold: float,
+    granularity: Optional[str],
+    window: Optional[int],
+    robust: bool,
+) -> str:
+    return f"bucket_days={bucket_days};granularity={granularity};z={z_threshold};window={window};robust={robust}"
+
+
+def _shard_pairs(db: Session, level: str, shard_size: int) -> List[List[str]]:
+    pairs = db.execute(
+        select(EventBucketCount.pair)
+        .where(EventBucketCount.granularity == level)
+        .distinct()
+        .order_by(EventBucketCount.pair)
+    ).scalars().all()
+    return [pairs[i:i + shard_size] for i in range(0, len(pairs), shard_size)]
+
+
+def _load_shard(db: Session, level: str, pairs: List[str]) -> List[SeriesRows]:
+    t = EventBucketCount
+    rows = db.execute(
+        select(t.pair, t.event_type, t.bucket_start, t.count)
+        .where(t.granularity == level, t.pair.in_(pairs))
+        .order_by(t.pair, t.event_type, t.bucket_start)
+    ).all()
+
+    series: List[SeriesRows] = []
+    for pair, event_type, start, count in rows:
+        if not series or series[-1][:2] != (pair, event_type):
+            series.append((pair, event_type, [], []))
+        series[-1][2].append(start)
+        series[-1][3].append(count)
+    return series
+
+
+def _score_shard(
+    shard: List[SeriesRows],
+    level: str,
+    unit: str,
+    width: int,
+    z_threshold: float,
+    window: Optional[int],
+    robust: bool,
+) -> List[Dict[str, Any]]:
+    """Worker: score one shard and return its flagged buckets."""
+    flagged: List[Dict[str, Any]] = []
+    for pair, event_type, starts, counts in shard:
+        series = series_from_level_rows(starts, counts, level=level, unit=unit, width=width)
+        for score in score_series(series, z_threshold=z_threshold, window=window, robust=robust):
+            if score["is_burst"]:
+                flagged.append(
+                    {
+                        "pair": pair,
+                        "event_type": event_type,
+                        "bucket_start": datetime.fromisoformat(score["bucket_start"]),
+                        "count": score["count"],
+                        "mean": score["mean"],
+                        "std": score["std"],
+                        "z": score["z"],
+                    }
+                )
+    return flagged
+
+
+def _ordered_results(executor: ProcessPoolExecutor, shards: Iterator, max_pending: int, **params) -> Iterator:
+    """Like executor.map, but keeps at most max_pending shards in flight."""
+    pending: deque = deque()
+    for shard in shards:
+        pending.append(executor.submit(_score_shard, shard, **params))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def run_sweep(
+    bucket_days: int = 7,
+    z_threshold: float = 1.5,
+    granularity: Optional[str] = None,
+    window: Optional[int] = None,
+    robust: bool = False,
+    workers: Optional[int] = None,
+    shard_size: int = 500,
+) -> int:
+    """
+    Score every series and replace the burst_results rows for this run_key.
+    Returns the number of flagged buckets written.
+    """
+    level, unit, width = resolve_level(bucket_days, granularity)
+    key = run_key(bucket_days, z_threshold, granularity, window, robust)
+    workers = workers or os.cpu_count() or 1
+    params = dict(level=level, unit=unit, width=width, z_threshold=z_threshold, window=window, robust=robust)
+
+    db = SessionLocal()
+    try:
+        shard_pairs = _shard_pairs(db, level, shard_size)
+        shards = (_load_shard(db, level, pairs) for pairs in shard_pairs)
+
+        db.execute(delete(BurstResult).where(BurstResult.run_key == key))
+        computed_at = datetime.utcnow()
+        written = 0
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for flagged in _ordered_results(executor, shards, max_pending=2 * workers, **params):
+                if flagged:
+                    for row in flagged:
+                        row["run_key"] = key
+                        row["computed_at"] = computed_at
+                    db.execute(insert(BurstResult), flagged)
+                    written += len(flagged)
+
+        db.commit()
+        return written
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a burst sweep over every pair/event_type series")
+    parser.add_argument("--bucket-days", type=int, default=7)
+    parser.add_argument("--z-threshold", type=float, default=1.5)
+    parser.add_argument("--granularity", type=str, default=None, help="day, week, month or quarter")
+    parser.add_argument("--window", type=int, default=None, help="Trailing window for local baselines")
+    parser.add_argument("--robust", action="store_true", help="Use median/MAD for the trailing window")
+    parser.add_argument("--workers", type=int, default=None, help="Process count (default: all cores)")
+    parser.add_argument("--shard-size", type=int, default=500, help="Pairs per shard")
+    args = parser.parse_args()
+
+    written = run_sweep(
+        bucket_days=args.bucket_days,
+        z_threshold=args.z_threshold,
+        granularity=args.granularity,
+        window=args.window,
+        robust=args.robust,
+        workers=args.workers,
+        shard_size=args.shard_size,
+    )
+    print(f"[sweep] Wrote {written} burst results")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+HTTP load test for a running API server.
+
+Keeps --concurrency requests in flight for --duration seconds, cycling over
+the given paths, and reports requests/s and latency percentiles per path.
+Save a run with --save and compare a later one against it with --baseline,
+e.g. before and after a change:
+
+    uvicorn backend.app.main:app --workers 1 &
+    python -m backend.app.api.load_test --pair A-B --save before.json
+    # ... switch code, restart the server ...
+    python -m backend.app.api.load_test --pair A-B --baseline before.json
+"""
+import argparse
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+DEFAULT_PATHS = ("/api/documents?limit=20", "/api/documents/1", "/api/events?limit=20")
+
+
+async def _worker(client, paths: List[str], offset: int, deadline: float, samples: Dict[str, List[float]], errors: Dict[str, int]) -> None:
+    i = offset
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        t0 = time.perf_counter()
+        try:
+            resp = await client.get(path)
+            ok = resp.status_code < 500
+        except Exception:
+            ok = False
+        if ok:
+            samples[path].append(time.perf_counter() - t0)
+        else:
+            errors[path] += 1
+
+
+async def run_load(url: str, paths: List[str], concurrency: int, duration: float, warmup: float) -> Dict[str, Any]:
+    import httpx  # only needed for the load test
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60.0) as client:
+        if warmup > 0:
+            scratch = {p: [] for p in paths}
+            deadline = time.perf_counter() + warmup
+            await asyncio.gather(*(_worker(client, paths, i, deadline, scratch, {p: 0 for p in paths}) for i in range(concurrency)))
+
+        samples: Dict[str, List[float]] = {p: [] for p in paths}
+        errors = {p: 0 for p in paths}
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*(_worker(client, paths, i, deadline, samples, errors) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    per_path = {}
+    for path in paths:
+        ms = np.array(samples[path]) * 1000
+        per_path[path] = {
+            "requests": len(ms),
+            "errors": errors[path],
+            "req_per_s": len(ms) / elapsed,
+            "p50_ms": float(np.percentile(ms, 50)) if len(ms) else None,
+            "p95_ms": float(np.percentile(ms, 95)) if len(ms) else None,
+            "p99_ms": float(np.percentile(ms, 99)) if len(ms) else None,
+        }
+    total = sum(r["requests"] for r in per_path.values())
+    return {
+        "url": url,
+        "concurrency": concurrency,
+        "duration": elapsed,
+        "req_per_s": total / elapsed,
+        "errors": sum(errors.values()),
+        "paths": per_path,
+    }
+
+
+def _fmt_ms(value: Optional[float]) -> str:
+    return f"{value:7.1f}" if value is not None else "      -"
+
+
+def report(result: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> None:
+    print(f"[load_test] {result['url']} concurrency={result['concurrency']} duration={result['duration']:.1f}s")
+    for path, r in result["paths"].items():
+        line = (
+            f"[load_test]   {path:<45} {r['req_per_s']:8.1f} req/s  p50 {_fmt_ms(r['p50_ms'])}ms  "
+            f"p95 {_fmt_ms(r['p95_ms'])}ms  p99 {_fmt_ms(r['p99_ms'])}ms  errors {r['errors']}"
+        )
+        before = (baseline or {}).get("paths", {}).get(path)
+        if before and before["req_per_s"]:
+            line += f"  ({r['req_per_s'] / before['req_per_s']:.2f}x baseline)"
+        print(line)
+    line = f"[load_test] total {result['req_per_s']:.1f} req/s, {result['errors']} errors"
+    if baseline and baseline.get("req_per_s"):
+        line += f" (baseline {baseline['req_per_s']:.1f} req/s, {result['req_per_s'] / baseline['req_per_s']:.2f}x)"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure API requests/s under concurrent load")
+    parser.add_argument("--url", type=str, default="http://127.0.0.1:8000")
+    parser.add_argument("--paths", type=str, default=",".join(DEFAULT_PATHS), help="Comma-separated request paths")
+    parser.add_argument("--pair", type=str, default=None, help="Also hit /api/analytics/bursts for this pair")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Unmeasured seconds before the run")
+    parser.add_argument("--save", type=Path, default=None, help="Write the result as JSON")
+    parser.add_argument("--baseline", type=Path, default=None, help="Compare against a saved result")
+    args = parser.parse_args()
+
+    paths = [p.strip() for p in args.paths.split(",") if p.strip()]
+    if args.pair:
+        paths.append(f"/api/analytics/bursts?pair={args.pair}")
+
+    result = asyncio.run(run_load(args.url, paths, args.concurrency, args.duration, args.warmup))
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline else None
+    report(result, baseline)
+    if args.save:
+        args.save.write_text(json.dumps(result, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
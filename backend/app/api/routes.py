@@ -1,36 +1,45 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from backend.app.db.deps import get_db
-from backend.app.db.schema import Document, Event
+from backend.app.db.deps import get_async_db
+from backend.app.db.schema import Document, Event, Page
 from backend.app.models.schemas import DocumentOut
-from backend.app.analytics.anomaly import compute_bursts_for_pair
+from backend.app.analytics.cache import result_cache
+from backend.app.analytics.executor import run_analytics
+from backend.app.analytics.anomaly import (
+    compute_bursts_all_pairs,
+    compute_bursts_for_pair,
+    compute_kleinberg_bursts_for_pair,
+    compute_scores_for_pair,
+)
+from backend.app.ingestion.bates_index import get_bates_index
 
 
 router = APIRouter()
 
 @router.get("/documents/debug")
-def list_docs_debug(db: Session = Depends(get_db)):
-    docs = db.query(Document).limit(3).all()
-    return [{"id": d.id, "raw_path": d.raw_path} for d in docs]
+async def list_docs_debug(db: AsyncSession = Depends(get_async_db)):
+    rows = await db.execute(select(Document.id, Document.raw_path).limit(3))
+    return [{"id": doc_id, "raw_path": raw_path} for doc_id, raw_path in rows]
 
 @router.get("/search")
-def search(q: str = "", limit: int = 20):
+async def search(q: str = "", limit: int = 20):
     # TODO: hook OpenSearch later
     return {"results": []}
 
 
 @router.get("/documents", response_model=List[DocumentOut])
-def list_documents(limit: int = 50, db: Session = Depends(get_db)):
-    docs = db.query(Document).limit(limit).all()
-    return docs
+async def list_documents(limit: int = 50, db: AsyncSession = Depends(get_async_db)):
+    docs = await db.scalars(select(Document).limit(limit))
+    return docs.all()
 
 
 @router.get("/documents/{doc_id}", response_model=DocumentOut)
-def get_document(doc_id: int, db: Session = Depends(get_db)):
-    doc = db.query(Document).get(doc_id)
+async def get_document(doc_id: int, db: AsyncSession = Depends(get_async_db)):
+    doc = await db.get(Document, doc_id)
     if not doc:
         # in v1 we can just return 404 later; for now return empty-ish
         return DocumentOut(
@@ -45,13 +54,89 @@ def get_document(doc_id: int, db: Session = Depends(get_db)):
     return doc
 
 @router.get("/analytics/bursts")
-def get_bursts(pair: str, bucket_days: int = 7, z_threshold: float = 1.5):
-    bursts = compute_bursts_for_pair(pair=pair, bucket_days=bucket_days, z_threshold=z_threshold)
-    return {"pair": pair, "bursts": bursts}
+async def get_bursts(
+    pair: str,
+    bucket_days: int = 7,
+    z_threshold: float = 1.5,
+    granularity: Optional[str] = None,
+    method: str = "zscore",
+    s: float = 2.0,
+    gamma: float = 1.0,
+    states: int = 2,
+    window: Optional[int] = None,
+    robust: bool = False,
+    event_type: Optional[str] = None,
+):
+    # granularity ("day", "week", "month", "quarter") overrides bucket_days;
+    # s/gamma/states only apply to method="kleinberg".
+    # window scores each bucket against its trailing N buckets and also
+    # returns the full per-bucket score curve.
+    try:
+        if method == "zscore" and window is not None:
+            scores = await run_analytics(
+                compute_scores_for_pair,
+                pair=pair,
+                bucket_days=bucket_days,
+                z_threshold=z_threshold,
+                granularity=granularity,
+                window=window,
+                robust=robust,
+                event_type=event_type,
+            )
+            bursts = [sc for sc in scores if sc["is_burst"]]
+            return {"pair": pair, "method": method, "bursts": bursts, "scores": scores}
+        elif method == "zscore":
+            bursts = await run_analytics(
+                compute_bursts_for_pair,
+                pair=pair,
+                bucket_days=bucket_days,
+                z_threshold=z_threshold,
+                granularity=granularity,
+                event_type=event_type,
+            )
+        elif method == "kleinberg":
+            bursts = await run_analytics(
+                compute_kleinberg_bursts_for_pair,
+                pair=pair,
+                s=s,
+                gamma=gamma,
+                n_states=states,
+                event_type=event_type,
+            )
+        else:
+            raise ValueError(f"Unknown method: {method!r}")
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return {"pair": pair, "method": method, "bursts": bursts}
+
+@router.get("/analytics/bursts/batch")
+async def get_bursts_batch(
+    bucket_days: int = 7,
+    z_threshold: float = 1.5,
+    by_event_type: bool = True,
+    limit: int = 100,
+    granularity: Optional[str] = None,
+):
+    try:
+        series = await run_analytics(
+            compute_bursts_all_pairs,
+            bucket_days=bucket_days,
+            z_threshold=z_threshold,
+            by_event_type=by_event_type,
+            limit=limit,
+            granularity=granularity,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return {"series": series}
+
+@router.get("/analytics/cache")
+async def get_analytics_cache_stats():
+    return result_cache.stats()
 
 @router.get("/events")
-def list_events(limit: int = 20, db: Session = Depends(get_db)):
-    evs = db.query(Event).order_by(Event.event_time).limit(limit).all()
+async def list_events(limit: int = 20, db: AsyncSession = Depends(get_async_db)):
+    evs = (await db.scalars(select(Event).order_by(Event.event_time).limit(limit))).all()
     return [
         {
             "id": e.id,
@@ -62,3 +147,31 @@ def list_events(limit: int = 20, db: Session = Depends(get_db)):
         }
         for e in evs
     ]
+
+@router.get("/bates/{bates_id}")
+async def get_bates(bates_id: str, db: AsyncSession = Depends(get_async_db)):
+    index = get_bates_index()
+    if index is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Bates index not built; run python -m backend.app.ingestion.bates_index",
+        )
+    hit = index.lookup(bates_id)
+    if hit is None:
+        raise HTTPException(status_code=404, detail=f"No Bates range contains {bates_id!r}")
+
+    document = page = None
+    if hit["document_id"] is not None:
+        doc = await db.get(Document, hit["document_id"])
+        if doc:
+            document = {"id": doc.id, "external_id": doc.external_id, "title": doc.title, "raw_path": doc.raw_path}
+            pg = (
+                await db.execute(
+                    select(Page.id, Page.page_number, Page.bates_id, Page.image_path)
+                    .where(Page.document_id == doc.id, Page.page_number == hit["page_number"])
+                    .limit(1)
+                )
+            ).first()
+            if pg:
+                page = {"id": pg.id, "page_number": pg.page_number, "bates_id": pg.bates_id, "image_path": pg.image_path}
+    return {**hit, "document": document, "page": page}
@@ -7,6 +7,11 @@ class Settings(BaseSettings):
     neo4j_url: str = "bolt://localhost:7687"
     neo4j_user: str = "neo4j"
     neo4j_password: str = "password"
+    analytics_cache_size: int = 256
+    analytics_version_ttl: float = 1.0
+    bates_index_dir: str = "data/index/bates"
+    async_pool_size: int = 20
+    analytics_workers: int = 4
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,37 @@
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from backend.app.config.settings import settings
+
+# Async drivers for the sync DSNs we accept in settings.postgres_dsn
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_dsn(dsn: str) -> str:
+    """Swap a sync DSN's driver for its async counterpart (postgresql:// -> postgresql+asyncpg://)."""
+    url = make_url(dsn)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend!r}")
+    return url.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+def _pool_options(dsn: str) -> dict:
+    # aiosqlite opens a connection per checkout (NullPool) and takes no sizing
+    if make_url(dsn).get_backend_name() == "sqlite":
+        return {}
+    # No overflow: under a burst, requests wait for a pooled connection instead
+    # of opening (and then closing) extra ones, which costs more than the query
+    return {"pool_size": settings.async_pool_size, "max_overflow": 0}
+
+
+async_engine = create_async_engine(
+    async_dsn(settings.postgres_dsn),
+    echo=False,
+    **_pool_options(settings.postgres_dsn),
+)
+# Routes read attributes after the session closes, so keep them loaded
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
@@ -0,0 +1,60 @@
+"""
+Stream rows into a Postgres table with COPY ... FROM STDIN (CSV format).
+"""
+import io
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Sequence
+
+from sqlalchemy.orm import Session
+
+COPY_CHUNK = 10_000
+
+
+def _copy_field(value: Any) -> str:
+    # COPY csv: unquoted empty is NULL, anything quoted is a literal string
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    elif isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def _copy_chunk(cursor, table: str, columns: Sequence[str], chunk: List[Dict[str, Any]]) -> None:
+    buf = io.StringIO()
+    for row in chunk:
+        buf.write(",".join(_copy_field(row.get(col)) for col in columns))
+        buf.write("\n")
+    buf.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+
+
+def copy_rows(
+    db: Session,
+    table: str,
+    columns: Sequence[str],
+    rows: Iterable[Dict[str, Any]],
+    chunk_size: int = COPY_CHUNK,
+) -> int:
+    """
+    COPY dict rows into `table` inside the session's current transaction,
+    one COPY per chunk_size rows. Returns the number of rows sent.
+    """
+    cursor = db.connection().connection.cursor()
+    sent = 0
+    try:
+        chunk: List[Dict[str, Any]] = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                _copy_chunk(cursor, table, columns, chunk)
+                sent += len(chunk)
+                chunk = []
+        if chunk:
+            _copy_chunk(cursor, table, columns, chunk)
+            sent += len(chunk)
+    finally:
+        cursor.close()
+    return sent
@@ -1,5 +1,8 @@
-from typing import Generator
+from typing import AsyncGenerator, Generator
 
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.app.db.async_session import AsyncSessionLocal
 from backend.app.db.session import SessionLocal
 
 def get_db() -> Generator:
@@ -8,3 +11,8 @@ def get_db() -> Generator:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,37 @@
+"""
+Migration: add the unique index on documents.raw_path to an existing database.
+
+    python -m backend.app.db.migrate_documents_raw_path
+
+Fails if duplicate raw_path rows exist; the duplicates are listed so they can
+be cleaned up first. New databases get the index from create_tables.
+"""
+from sqlalchemy import text
+
+from backend.app.db.session import engine
+
+DUPLICATES_SQL = (
+    "SELECT raw_path, COUNT(*) FROM documents "
+    "WHERE raw_path IS NOT NULL GROUP BY raw_path HAVING COUNT(*) > 1 LIMIT 20"
+)
+MIGRATION_SQL = "CREATE UNIQUE INDEX IF NOT EXISTS ix_documents_raw_path ON documents (raw_path)"
+
+
+def migrate() -> None:
+    with engine.begin() as conn:
+        duplicates = conn.execute(text(DUPLICATES_SQL)).all()
+        if duplicates:
+            for raw_path, n in duplicates:
+                print(f"[migrate] duplicate raw_path ({n}x): {raw_path}")
+            raise RuntimeError("Remove duplicate documents.raw_path rows before adding the unique index")
+        print(f"[migrate] {MIGRATION_SQL}")
+        conn.execute(text(MIGRATION_SQL))
+
+
+def main():
+    migrate()
+    print("Done.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Migration: add events.source_key and its unique index to an existing
+Postgres database. Bulk loaders merge on this key so re-runs skip rows that
+are already loaded.
+
+    python -m backend.app.db.migrate_event_source_key
+
+Rows loaded before the column existed keep source_key NULL; delete and
+reload them if they should take part in deduplication. New databases get the
+column from create_tables.
+"""
+from sqlalchemy import text
+
+from backend.app.db.session import engine
+
+MIGRATION_SQL = [
+    "ALTER TABLE events ADD COLUMN IF NOT EXISTS source_key VARCHAR",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_events_source_key ON events (source_key)",
+]
+
+
+def migrate() -> None:
+    if engine.dialect.name != "postgresql":
+        raise RuntimeError("migrate_event_source_key targets Postgres; recreate other databases with create_tables")
+    with engine.begin() as conn:
+        for stmt in MIGRATION_SQL:
+            print(f"[migrate] {stmt}")
+            conn.execute(text(stmt))
+
+
+def main():
+    migrate()
+    print("Done.")
+
+
+if __name__ == "__main__":
+    main()
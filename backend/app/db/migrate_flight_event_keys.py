@@ -0,0 +1,114 @@
+"""
+Migration: convert flight events' source_key to the current form,
+"<path relative to FLIGHT_LOGS_DIR>:<line>", so re-running the loader skips
+them instead of inserting them again.
+
+    python -m backend.app.db.migrate_flight_event_keys [--dry-run]
+
+Keys written by older loaders are handled as follows:
+
+- "<sha256>:<n>" content-hash keys cannot be mapped to a line, so those
+  events are deleted and come back on the next flight_logs_structured run;
+- "<path>:<line>" keys are re-keyed; an event whose new key is already taken
+  is a duplicate and is deleted.
+
+Rollup counts are adjusted for deleted events and the events data version is
+bumped, so cached analytics are recomputed.
+"""
+import argparse
+import re
+from collections import Counter
+from typing import List, Optional
+
+from sqlalchemy import delete, select, update
+
+from backend.app.analytics.rollup import add_event, apply_deltas, mark_events_written
+from backend.app.db.session import SessionLocal
+from backend.app.db.schema import Event
+from backend.app.ingestion.flight_logs_structured import FLIGHT_LOGS_DIR, relative_to_flight_logs
+
+CONTENT_HASH_KEY_RE = re.compile(r"^[0-9a-f]{64}:\d+$")
+WINDOWS_DRIVE_RE = re.compile(r"^[A-Za-z]:/")
+CHUNK = 1000
+
+
+def current_key(old_key: str) -> Optional[str]:
+    """
+    The current-form key for a flight event key, or None if it cannot be
+    derived (the event has to be reloaded). Returns old_key unchanged if it
+    is already in the current form.
+    """
+    if CONTENT_HASH_KEY_RE.match(old_key):
+        return None
+    path, sep, line = old_key.rpartition(":")
+    if not sep or not line.isdigit():
+        return None
+
+    posix = path.replace("\\", "/")
+    if posix.startswith("/") or WINDOWS_DRIVE_RE.match(posix) or FLIGHT_LOGS_DIR.as_posix() in posix:
+        return f"{relative_to_flight_logs(posix)}:{line}"
+    # Relative and not under FLIGHT_LOGS_DIR: already relative to it
+    return old_key
+
+
+def migrate(dry_run: bool = False) -> None:
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(Event.id, Event.source_key)
+            .where(Event.event_type == "flight", Event.source_key.is_not(None))
+            .execution_options(yield_per=10_000)
+        ).all()
+
+        taken = set()
+        renames = []
+        for event_id, key in rows:
+            new_key = current_key(key)
+            if new_key == key:
+                taken.add(key)
+            else:
+                renames.append((event_id, new_key))
+
+        updates = []
+        doomed: List[int] = []
+        for event_id, new_key in renames:
+            if new_key is None or new_key in taken:
+                doomed.append(event_id)
+            else:
+                taken.add(new_key)
+                updates.append({"id": event_id, "source_key": new_key})
+
+        print(f"[migrate] {len(rows)} flight events with a source_key: {len(updates)} re-keyed, {len(doomed)} to delete")
+        if dry_run or not (updates or doomed):
+            return
+
+        deltas: Counter = Counter()
+        for i in range(0, len(doomed), CHUNK):
+            chunk = doomed[i : i + CHUNK]
+            for meta_json, event_type, event_time in db.execute(
+                select(Event.meta_json, Event.event_type, Event.event_time).where(Event.id.in_(chunk))
+            ):
+                add_event(deltas, meta_json, event_type, event_time, sign=-1)
+            db.execute(delete(Event).where(Event.id.in_(chunk)).execution_options(synchronize_session=False))
+
+        # Deletes go first so a re-keyed event never collides with a doomed one
+        for i in range(0, len(updates), CHUNK):
+            db.execute(update(Event), updates[i : i + CHUNK])
+
+        apply_deltas(db, deltas)
+        mark_events_written(db)
+        db.commit()
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert flight event source keys to the current form")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+    args = parser.parse_args()
+    migrate(dry_run=args.dry_run)
+    print("Done.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Migration: add the unique (document_id, page_number) index on pages to an
+existing database. Page extraction upserts on it and reads a document's
+pages through it.
+
+    python -m backend.app.db.migrate_pages_document_index
+
+Duplicate pages are collapsed onto the lowest id first (entity mentions are
+repointed to it), and an earlier non-unique index of the same name is
+replaced. New databases get the index from create_tables.
+"""
+from sqlalchemy import text
+
+from backend.app.db.session import engine
+
+MIGRATION_SQL = [
+    """
+    UPDATE entity_mentions SET page_id = (
+        SELECT MIN(keep.id) FROM pages AS dup
+        JOIN pages AS keep
+          ON keep.document_id = dup.document_id AND keep.page_number = dup.page_number
+        WHERE dup.id = entity_mentions.page_id
+    )
+    WHERE page_id IS NOT NULL
+    """,
+    "DELETE FROM pages WHERE id NOT IN (SELECT MIN(id) FROM pages GROUP BY document_id, page_number)",
+    "DROP INDEX IF EXISTS ix_pages_document_page",
+    "CREATE UNIQUE INDEX ix_pages_document_page ON pages (document_id, page_number)",
+]
+
+
+def migrate() -> None:
+    with engine.begin() as conn:
+        for stmt in MIGRATION_SQL:
+            print(f"[migrate] {' '.join(stmt.split())}")
+            conn.execute(text(stmt))
+
+
+def main():
+    migrate()
+    print("Done.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,19 @@
 from sqlalchemy import (
+    BigInteger,
     Column,
     Integer,
     String,
     Text,
     Boolean,
+    Computed,
     DateTime,
+    Float,
+    Index,
     ForeignKey,
     JSON,
+    UniqueConstraint,
 )
-from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy.orm import declarative_base, deferred, relationship
 
 Base = declarative_base()
 
@@ -37,8 +42,10 @@ class Document(Base):
     event_time_start = Column(DateTime, nullable=True)
     event_time_end = Column(DateTime, nullable=True)
     ingest_time = Column(DateTime, nullable=True)
-    text = Column(Text, nullable=True)
-    raw_path = Column(String, nullable=True)
+    # Page text lives in pages; this column is only loaded on access and is
+    # left empty by page-streaming ingestion (see backend.app.ingestion.pages)
+    text = deferred(Column(Text, nullable=True))
+    raw_path = Column(String, nullable=True, unique=True, index=True)
     ocr_confidence = Column(Integer, nullable=True)
     is_searchable = Column(Boolean, default=True)
     meta_json = Column(JSON, nullable=True)
@@ -51,6 +58,7 @@ class Document(Base):
 
 class Page(Base):
     __tablename__ = "pages"
+    __table_args__ = (Index("ix_pages_document_page", "document_id", "page_number", unique=True),)
 
     id = Column(Integer, primary_key=True, index=True)
     document_id = Column(Integer, ForeignKey("documents.id"), nullable=False)
@@ -132,6 +140,11 @@ class Relationship(Base):
 
 class Event(Base):
     __tablename__ = "events"
+    __table_args__ = (
+        # Serves pair filters and pair-ordered time scans;
+        # existing databases: python -m backend.app.db.migrate_event_pair
+        Index("ix_events_pair_event_time", "pair", "event_time"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     document_id = Column(Integer, ForeignKey("documents.id"), nullable=True)
@@ -139,5 +152,76 @@ class Event(Base):
     event_time = Column(DateTime, index=True)
     description = Column(Text, nullable=True)
     meta_json = Column(JSON, nullable=True)
+    # Generated from meta_json["pair"]; never written directly
+    pair = Column(String, Computed("meta_json->>'pair'", persisted=True))
+    # Natural key for idempotent loaders (e.g. hash of source file + row);
+    # existing databases: python -m backend.app.db.migrate_event_source_key
+    source_key = Column(String, nullable=True, unique=True, index=True)
 
     document = relationship("Document")
+
+
+class EventBucketCount(Base):
+    """
+    Rollup of event counts per (pair, event_type) series and time bucket.
+    Maintained incrementally by backend.app.analytics.rollup.
+    """
+    __tablename__ = "event_bucket_counts"
+    __table_args__ = (
+        UniqueConstraint("pair", "event_type", "granularity", "bucket_start", name="uq_event_bucket_counts_key"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    pair = Column(String, nullable=False, index=True)
+    event_type = Column(String, nullable=False, default="")
+    granularity = Column(String, nullable=False)  # "day", "week", "month", "quarter"
+    bucket_start = Column(DateTime, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class DataVersion(Base):
+    """
+    Monotonic write counters (e.g. name="events"), bumped in the same
+    transaction as the writes so caches can key on them.
+    """
+    __tablename__ = "data_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class BurstResult(Base):
+    """
+    Flagged buckets persisted by the analytics sweep
+    (backend.app.analytics.sweep). run_key identifies the sweep parameters;
+    a new run with the same key replaces the previous rows.
+    """
+    __tablename__ = "burst_results"
+
+    id = Column(Integer, primary_key=True, index=True)
+    run_key = Column(String, nullable=False, index=True)
+    pair = Column(String, nullable=False, index=True)
+    event_type = Column(String, nullable=True)
+    bucket_start = Column(DateTime, nullable=False)
+    count = Column(Integer, nullable=False)
+    mean = Column(Float, nullable=True)
+    std = Column(Float, nullable=True)
+    z = Column(Float, nullable=True)
+    computed_at = Column(DateTime, nullable=True)
+
+
+class IngestManifest(Base):
+    """
+    One row per file seen by file-tree ingesters: size/mtime let unchanged
+    files be skipped without opening them, sha256 detects real content
+    changes, and status records whether the last attempt finished.
+    """
+    __tablename__ = "ingest_manifest"
+
+    id = Column(Integer, primary_key=True, index=True)
+    path = Column(String, nullable=False, unique=True, index=True)
+    size = Column(BigInteger, nullable=True)
+    mtime_ns = Column(BigInteger, nullable=True)
+    sha256 = Column(String(64), nullable=True)
+    status = Column(String, nullable=False)  # "done" or "failed"
+    updated_at = Column(DateTime, nullable=True)
@@ -1,5 +1,5 @@
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from backend.app.config.settings import settings
 
 engine = create_engine(settings.postgres_dsn, echo=False, future=True)
@@ -11,3 +11,8 @@ print(">> DEBUG POSTGRES_DSN:", settings.postgres_dsn)
 engine = create_engine(settings.postgres_dsn, echo=False, future=True)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 
+# Keep event_bucket_counts and the events data version in sync with ORM
+# event writes in every session, whoever created it
+from backend.app.analytics.rollup import register_session_hooks  # noqa: E402  (rollup does not import this module)
+
+register_session_hooks(Session)
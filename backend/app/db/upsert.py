@@ -0,0 +1,14 @@
+from sqlalchemy.dialects import postgresql, sqlite
+
+
+def dialect_insert(bind):
+    """
+    Return the dialect-specific insert() construct (with on_conflict_* support)
+    for a Connection, Engine or Session bind.
+    """
+    name = bind.dialect.name if hasattr(bind, "dialect") else bind.get_bind().dialect.name
+    if name == "postgresql":
+        return postgresql.insert
+    if name == "sqlite":
+        return sqlite.insert
+    raise NotImplementedError(f"Upsert not supported on {name}")
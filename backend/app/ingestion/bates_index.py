@@ -0,0 +1,260 @@
+"""
+Interval index over Bates ranges from load files (VOL*.DAT).
+
+A Bates id such as "EFTA00000123" splits into a prefix ("EFTA") and a number
+(123). Each (Begin Bates, End Bates) range is stored as a packed int64 key
+(prefix id << 40 | begin number) next to its end number, the zero-pad width
+and the owning Document id, all in parallel arrays sorted by key. A lookup is
+one binary search for the last range starting at or before the id, so it is
+O(log n) and touches a handful of pages of the arrays.
+
+The arrays are saved as .npy files and opened with mmap_mode="r", so API
+workers share one page-cached copy however many volumes are indexed. A build
+writes new array files first and then swaps the small JSON manifest that
+names them, so readers never see a half-written index; the previous build's
+files are kept until the next build so a reader that just read the old
+manifest can still open them.
+
+    python -m backend.app.ingestion.bates_index
+    python -m backend.app.ingestion.bates_index --dat path/to/VOL00002.DAT --dat ...
+"""
+import argparse
+import json
+import os
+import re
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from backend.app.config.settings import settings
+from backend.app.db.session import SessionLocal
+from backend.app.db.schema import Document
+from backend.app.ingestion.flight_logs_v1 import VOL00001_DAT, load_bates_ranges
+
+BATES_ID_RE = re.compile(r"^(.*?)(\d+)$")
+NUMBER_BITS = 40
+MAX_NUMBER = (1 << NUMBER_BITS) - 1
+MANIFEST_NAME = "manifest.json"
+ARRAYS = ("keys", "ends", "widths", "doc_ids")
+NO_DOCUMENT = -1
+
+
+def parse_bates(bates_id: str) -> Optional[Tuple[str, int, int]]:
+    """Split a Bates id into (prefix, number, digit width), or None if it has no trailing number."""
+    match = BATES_ID_RE.match(bates_id.strip())
+    if not match:
+        return None
+    prefix, digits = match.groups()
+    number = int(digits)
+    if number > MAX_NUMBER:
+        return None
+    return prefix, number, len(digits)
+
+
+class BatesIndex:
+    def __init__(
+        self,
+        prefixes: List[str],
+        keys: np.ndarray,
+        ends: np.ndarray,
+        widths: np.ndarray,
+        doc_ids: np.ndarray,
+    ):
+        self.prefixes = prefixes
+        self.prefix_ids = {prefix: i for i, prefix in enumerate(prefixes)}
+        self.keys = keys
+        self.ends = ends
+        self.widths = widths
+        self.doc_ids = doc_ids
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @classmethod
+    def build(
+        cls,
+        ranges: Iterable[Tuple[str, str]],
+        documents: Optional[Dict[str, int]] = None,
+    ) -> Tuple["BatesIndex", int]:
+        """
+        Index (begin, end) Bates ranges. documents maps a begin id to the
+        owning Document id. Returns the index and the number of ranges
+        skipped (unparseable ids, or begin/end with different prefixes).
+        Duplicate begins keep the first range.
+        """
+        documents = documents or {}
+        prefix_ids: Dict[str, int] = {}
+        rows: Dict[int, Tuple[int, int, int]] = {}
+        skipped = 0
+        for begin, end in ranges:
+            b, e = parse_bates(begin), parse_bates(end)
+            if b is None or e is None or b[0] != e[0] or e[1] < b[1]:
+                skipped += 1
+                continue
+            prefix, number, width = b
+            key = (prefix_ids.setdefault(prefix, len(prefix_ids)) << NUMBER_BITS) | number
+            if key not in rows:
+                rows[key] = (e[1], width, documents.get(begin, NO_DOCUMENT))
+
+        keys = np.fromiter(sorted(rows), dtype=np.int64, count=len(rows))
+        ends = np.fromiter((rows[k][0] for k in keys.tolist()), dtype=np.int64, count=len(rows))
+        widths = np.fromiter((rows[k][1] for k in keys.tolist()), dtype=np.int8, count=len(rows))
+        doc_ids = np.fromiter((rows[k][2] for k in keys.tolist()), dtype=np.int64, count=len(rows))
+        prefixes = sorted(prefix_ids, key=prefix_ids.get)
+        return cls(prefixes, keys, ends, widths, doc_ids), skipped
+
+    def save(self, root: Path) -> None:
+        root.mkdir(parents=True, exist_ok=True)
+        build_id = uuid.uuid4().hex[:12]
+        files = {}
+        for name in ARRAYS:
+            files[name] = f"{name}-{build_id}.npy"
+            np.save(root / files[name], getattr(self, name))
+
+        try:
+            previous = json.loads((root / MANIFEST_NAME).read_text(encoding="utf-8"))["build_id"]
+        except (OSError, ValueError, KeyError):
+            previous = None
+
+        manifest = {
+            "build_id": build_id,
+            "built_at": time.time(),
+            "size": len(self),
+            "prefixes": self.prefixes,
+            "files": files,
+        }
+        tmp = root / f"{MANIFEST_NAME}.{build_id}.tmp"
+        tmp.write_text(json.dumps(manifest), encoding="utf-8")
+        os.replace(tmp, root / MANIFEST_NAME)
+
+        # Keep the previous build too: a reader may have just read its
+        # manifest. Files still memory-mapped can't be removed on Windows;
+        # they are retried on the next build.
+        keep = {build_id, previous}
+        for path in root.glob("*.npy"):
+            if path.stem.rsplit("-", 1)[-1] not in keep:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+    @classmethod
+    def load(cls, root: Path) -> "BatesIndex":
+        try:
+            return cls._load(root)
+        except FileNotFoundError:
+            # Two rebuilds landed between reading the manifest and opening its files
+            return cls._load(root)
+
+    @classmethod
+    def _load(cls, root: Path) -> "BatesIndex":
+        manifest = json.loads((root / MANIFEST_NAME).read_text(encoding="utf-8"))
+        arrays = {name: np.load(root / manifest["files"][name], mmap_mode="r") for name in ARRAYS}
+        index = cls(manifest["prefixes"], **arrays)
+        if len(index) != manifest["size"]:
+            raise RuntimeError(f"Bates index at {root} is inconsistent with its manifest")
+        return index
+
+    def _format(self, pos: int, number: int) -> str:
+        prefix = self.prefixes[int(self.keys[pos]) >> NUMBER_BITS]
+        return f"{prefix}{number:0{int(self.widths[pos])}d}"
+
+    def lookup(self, bates_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Find the range containing bates_id. Returns the range bounds, the
+        owning document id (None if no document matched at build time) and
+        the 1-based page number within that document, or None.
+        """
+        parsed = parse_bates(bates_id)
+        if parsed is None:
+            return None
+        prefix, number, _ = parsed
+        prefix_id = self.prefix_ids.get(prefix)
+        if prefix_id is None:
+            return None
+
+        key = (prefix_id << NUMBER_BITS) | number
+        pos = int(np.searchsorted(self.keys, key, side="right")) - 1
+        if pos < 0 or int(self.keys[pos]) >> NUMBER_BITS != prefix_id:
+            return None
+        begin = int(self.keys[pos]) & MAX_NUMBER
+        end = int(self.ends[pos])
+        if number > end:
+            return None
+
+        doc_id = int(self.doc_ids[pos])
+        return {
+            "bates_id": bates_id,
+            "begin_bates": self._format(pos, begin),
+            "end_bates": self._format(pos, end),
+            "document_id": None if doc_id == NO_DOCUMENT else doc_id,
+            "page_number": number - begin + 1,
+        }
+
+
+def document_ids_by_stem(db: Session) -> Dict[str, int]:
+    """Map Document.external_id without its extension ('EFTA00000001.pdf' -> 'EFTA00000001') to Document.id."""
+    stems = {}
+    rows = db.execute(select(Document.id, Document.external_id).execution_options(yield_per=10_000))
+    for doc_id, external_id in rows:
+        if external_id:
+            stems.setdefault(external_id.rsplit(".", 1)[0], doc_id)
+    return stems
+
+
+_loaded: Dict[str, Any] = {"mtime_ns": None, "index": None}
+
+
+def get_bates_index(root: Optional[Path] = None) -> Optional[BatesIndex]:
+    """
+    Process-wide index, loaded on first use and reloaded when a rebuild
+    replaces the manifest. Returns None if no index has been built.
+    """
+    root = Path(root or settings.bates_index_dir)
+    try:
+        mtime_ns = (root / MANIFEST_NAME).stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if _loaded["mtime_ns"] != mtime_ns:
+        _loaded["index"] = BatesIndex.load(root)
+        _loaded["mtime_ns"] = mtime_ns
+    return _loaded["index"]
+
+
+def build_bates_index(dat_paths: List[Path], out_dir: Path) -> BatesIndex:
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        documents = document_ids_by_stem(db)
+    finally:
+        db.close()
+
+    ranges = (r for path in dat_paths for r in load_bates_ranges(path))
+    index, skipped = BatesIndex.build(ranges, documents)
+    index.save(out_dir)
+
+    linked = int((index.doc_ids != NO_DOCUMENT).sum())
+    print(
+        f"[bates_index] {len(index)} ranges from {len(dat_paths)} load file(s) "
+        f"({linked} linked to documents, {skipped} skipped) -> {out_dir} "
+        f"in {time.perf_counter() - started:.2f}s"
+    )
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the Bates range index used by /api/bates/{bates_id}")
+    parser.add_argument("--dat", type=Path, action="append", help="Load file to index (repeatable; default VOL00001.DAT)")
+    parser.add_argument("--out", type=Path, default=Path(settings.bates_index_dir))
+    args = parser.parse_args()
+
+    build_bates_index(args.dat or [VOL00001_DAT], args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Date/time parsing for structured log ingestion.
+
+Log files tend to use one format throughout and repeat the same strings many
+times, so a FormatParser first infers the winning strptime format from a
+sample of the column, tries it before any other format, and memoizes
+string -> value conversions in a bounded LRU cache. parse_column converts a
+whole batch, parsing each distinct string once. stats counts rows by the
+path that resolved them: "parsed" (winning format), "fallback" (a later
+format) or "unparsed".
+"""
+from collections import Counter
+from datetime import date, datetime, time as dt_time
+from functools import lru_cache
+from typing import Callable, Generic, Iterable, List, Optional, Sequence, TypeVar
+
+T = TypeVar("T")
+
+DATE_FORMATS = ("%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y", "%m/%d/%Y")
+TIME_FORMATS = ("%H:%M", "%H:%M:%S", "%I:%M %p")
+PARSE_CACHE_SIZE = 8192
+INFER_SAMPLE_SIZE = 200
+
+
+class FormatParser(Generic[T]):
+    def __init__(
+        self,
+        formats: Sequence[str],
+        convert: Callable[[datetime], T],
+        cache_size: int = PARSE_CACHE_SIZE,
+    ):
+        self.formats = tuple(formats)
+        self.convert = convert
+        self.stats: Counter = Counter()
+        self._parse_cached = lru_cache(maxsize=cache_size)(self._parse_uncached)
+
+    def infer(self, sample: Iterable[str]) -> Optional[str]:
+        """
+        Reorder formats so the one that parses the most sample values comes
+        first (ties keep the declared order). Returns the winning format, or
+        None if nothing in the sample parsed.
+        """
+        wins: Counter = Counter()
+        for value in sample:
+            value = value.strip()
+            if not value:
+                continue
+            for fmt in self.formats:
+                try:
+                    datetime.strptime(value, fmt)
+                except ValueError:
+                    continue
+                wins[fmt] += 1
+
+        if not wins:
+            return None
+        order = {fmt: i for i, fmt in enumerate(self.formats)}
+        self.formats = tuple(sorted(self.formats, key=lambda f: (-wins[f], order[f])))
+        self._parse_cached.cache_clear()
+        return self.formats[0]
+
+    def _parse_uncached(self, value: str):
+        # Returns (value, path) so every row, cached or not, is counted
+        # against the path that produced it
+        for i, fmt in enumerate(self.formats):
+            try:
+                parsed = datetime.strptime(value, fmt)
+            except ValueError:
+                continue
+            return self.convert(parsed), "fallback" if i else "parsed"
+        return None, "unparsed"
+
+    def _lookup(self, value: Optional[str], n: int = 1) -> Optional[T]:
+        if not value:
+            return None
+        value = value.strip()
+        if not value:
+            return None
+        result, path = self._parse_cached(value)
+        self.stats[path] += n
+        return result
+
+    def parse(self, value: Optional[str]) -> Optional[T]:
+        return self._lookup(value)
+
+    def parse_column(self, values: Sequence[Optional[str]]) -> List[Optional[T]]:
+        """Parse a batch of values, converting each distinct string once."""
+        lookup = {v: self._lookup(v, n) for v, n in Counter(values).items()}
+        return [lookup[v] for v in values]
+
+    def cache_info(self):
+        return self._parse_cached.cache_info()
+
+
+def date_parser(cache_size: int = PARSE_CACHE_SIZE) -> "FormatParser[date]":
+    return FormatParser(DATE_FORMATS, datetime.date, cache_size=cache_size)
+
+
+def time_parser(cache_size: int = PARSE_CACHE_SIZE) -> "FormatParser[dt_time]":
+    return FormatParser(TIME_FORMATS, datetime.time, cache_size=cache_size)
@@ -1,14 +1,30 @@
+import argparse
+import hashlib
 import os
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
 from datetime import datetime
+from typing import Iterable, Iterator, Tuple
 
-import fitz  # PyMuPDF
+from sqlalchemy import select, update
+from sqlalchemy.engine import Connection
 from sqlalchemy.orm import Session
 
 from backend.app.db.session import SessionLocal, engine
-from backend.app.db.schema import Base, Source, Document
+from backend.app.db.schema import Base, Source, Document, IngestManifest, Page
+from backend.app.db.upsert import dialect_insert
+from backend.app.ingestion.metrics import StageMetrics
+from backend.app.ingestion.pages import PAGE_CHUNK, PdfExtractionError, iter_pdf_pages, replace_pages
 
 EPSTEIN_SUBSET_DIR = Path("data/raw/epstein_subset")
+INGEST_SUFFIXES = (".pdf", ".tif", ".tiff", ".jpg", ".jpeg", ".png")
+PATH_CHUNK = 1000
+HASH_BLOCK = 1 << 20
+MANIFEST_DONE = "done"
+MANIFEST_FAILED = "failed"
 
 
 def get_or_create_source(db: Session) -> Source:
@@ -28,74 +44,269 @@ def get_or_create_source(db: Session) -> Source:
     return src
 
 
-def extract_text_if_pdf(path: Path) -> str | None:
+def iter_candidate_files(root: Path) -> Iterator[Path]:
+    """Producer: walk the subset and yield ingestible files."""
+    for dirpath, _, files in os.walk(root):
+        for fname in files:
+            if fname.lower().endswith(INGEST_SUFFIXES):
+                yield Path(dirpath) / fname
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _init_worker() -> None:
+    # Forked workers must not reuse the parent's pooled connections
+    engine.dispose(close=False)
+
+
+def _upsert_document(conn: Connection, row: dict) -> int:
+    stmt = dialect_insert(conn)(Document.__table__).values(row)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["raw_path"],
+        set_={
+            "text": stmt.excluded.text,
+            "is_searchable": stmt.excluded.is_searchable,
+            "ingest_time": stmt.excluded.ingest_time,
+        },
+    ).returning(Document.id)
+    return conn.execute(stmt).scalar_one()
+
+
+def _extract_worker(item: Tuple[str, str | None, bool], source_id: int, page_chunk: int) -> dict:
     """
-    For now, only try to extract text from PDFs with embedded text.
-    TIFF/JPEG/etc. will be handled later via OCR.
+    Hash a file and, unless its content is already known (matching
+    known_sha, or adopt=True for documents whose pages are already stored),
+    stream its pages into the database. The Document row and all its pages
+    are written in one transaction; a PDF that cannot be read is recorded as
+    failed, while database errors are raised.
     """
-    if path.suffix.lower() != ".pdf":
-        return None
+    path_str, known_sha, adopt = item
+    path = Path(path_str)
+    result = {"path": path_str, "pages": 0, "extracted": False}
+    failed = {**result, "size": None, "mtime_ns": None, "sha256": None, "status": MANIFEST_FAILED}
     try:
-        doc = fitz.open(path)
-        parts: list[str] = []
-        for page in doc:
-            parts.append(page.get_text())
-        text = "\n".join(parts).strip()
-        return text or None
-    except Exception:
-        # Swallow errors for now; later we can log these
-        return None
-
-
-def ingest_epstein_subset():
+        st = path.stat()
+        sha = file_sha256(path)
+    except OSError:
+        return failed
+
+    result.update(size=st.st_size, mtime_ns=st.st_mtime_ns, sha256=sha, status=MANIFEST_DONE)
+    if adopt or sha == known_sha:
+        return result
+
+    fname = path.name
+    try:
+        with engine.begin() as conn:
+            doc_id = _upsert_document(
+                conn,
+                {
+                    "source_id": source_id,
+                    "external_id": fname,
+                    "doc_type": "generic_pdf",
+                    "title": fname,
+                    "description": None,
+                    "ingest_time": datetime.utcnow(),  # TODO: switch to timezone-aware
+                    "text": None,
+                    "raw_path": path_str,
+                    "ocr_confidence": None,
+                    "is_searchable": False,
+                    "meta_json": None,
+                },
+            )
+            n_pages, any_text = replace_pages(conn, doc_id, iter_pdf_pages(path), chunk_size=page_chunk)
+            if any_text:
+                conn.execute(update(Document).where(Document.id == doc_id).values(is_searchable=True))
+    except PdfExtractionError:
+        # Unreadable PDF: leave nothing behind and retry on the next run.
+        # Database errors propagate and abort the run.
+        return {**failed, "size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha}
+
+    return {**result, "pages": n_pages, "extracted": True}
+
+
+def plan_files(db: Session, paths: Iterable[str], stats: dict, chunk_size: int = PATH_CHUNK) -> Iterator[Tuple[str, str | None, bool]]:
+    """
+    Compare candidate files against ingest_manifest in chunks (one query per
+    chunk_size paths) and yield (path, known_sha, adopt) for files that need
+    work. Files whose size and mtime match a finished manifest row are
+    skipped without being opened.
+    """
+    def _plan(chunk: list[Tuple[str, os.stat_result]]) -> Iterator[Tuple[str, str | None, bool]]:
+        chunk_paths = [p for p, _ in chunk]
+        manifest = {
+            row.path: row
+            for row in db.execute(
+                select(IngestManifest.path, IngestManifest.size, IngestManifest.mtime_ns,
+                       IngestManifest.sha256, IngestManifest.status)
+                .where(IngestManifest.path.in_(chunk_paths))
+            )
+        }
+        unlisted = [p for p in chunk_paths if p not in manifest]
+        documented = set(
+            db.execute(
+                select(Document.raw_path)
+                .join(Page, Page.document_id == Document.id)
+                .where(Document.raw_path.in_(unlisted))
+                .distinct()
+            ).scalars()
+        ) if unlisted else set()
+
+        for path_str, st in chunk:
+            m = manifest.get(path_str)
+            if m is not None and m.status == MANIFEST_DONE and m.size == st.st_size and m.mtime_ns == st.st_mtime_ns:
+                stats["unchanged"] += 1
+                continue
+            if m is not None:
+                # A failed row's hash says nothing about stored pages
+                yield path_str, m.sha256 if m.status == MANIFEST_DONE else None, False
+            else:
+                yield path_str, None, path_str in documented
+
+    chunk: list[Tuple[str, os.stat_result]] = []
+    for path_str in paths:
+        try:
+            chunk.append((path_str, os.stat(path_str)))
+        except OSError:
+            continue
+        if len(chunk) >= chunk_size:
+            yield from _plan(chunk)
+            chunk = []
+    if chunk:
+        yield from _plan(chunk)
+
+
+def upsert_manifest(db: Session, rows: list[dict]) -> None:
+    if not rows:
+        return
+    stmt = dialect_insert(db)(IngestManifest.__table__).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["path"],
+        set_={
+            col: stmt.excluded[col]
+            for col in ("size", "mtime_ns", "sha256", "status", "updated_at")
+        },
+    )
+    db.execute(stmt)
+
+
+def _bounded_map(executor: Executor, fn, items: Iterable, max_pending: int) -> Iterator:
+    """executor.map with at most max_pending items in flight (results in input order)."""
+    pending: deque = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def ingest_epstein_subset(
+    workers: int | None = None,
+    batch_size: int = 200,
+    queue_size: int | None = None,
+    page_chunk: int = PAGE_CHUNK,
+    metrics: StageMetrics | None = None,
+) -> dict:
+    """
+    Pipelined, resumable ingestion.
+
+    The tree walk is checked against ingest_manifest; files that need work go
+    to a process pool that hashes them and, only when the content is new,
+    streams their pages into the pages table page_chunk rows at a time.
+    This process commits manifest rows every batch_size files, so an
+    interrupted run resumes after the last checkpoint. At most queue_size
+    files are in flight and each holds at most one page chunk in memory.
+    Returns the run's counters; metrics, if given, tracks files in flight
+    and pages extracted.
+    """
     if not EPSTEIN_SUBSET_DIR.exists():
         raise RuntimeError(f"Directory not found: {EPSTEIN_SUBSET_DIR}")
 
+    workers = workers or os.cpu_count() or 1
+    queue_size = queue_size or 4 * workers
+
     db = SessionLocal()
     try:
         source = get_or_create_source(db)
 
-        for root, _, files in os.walk(EPSTEIN_SUBSET_DIR):
-            for fname in files:
-                if not fname.lower().endswith((".pdf", ".tif", ".tiff", ".jpg", ".jpeg", ".png")):
-                    continue
+        started = time.perf_counter()
+        stats = {"docs": 0, "pages": 0, "unchanged": 0, "rehashed": 0, "failed": 0}
+        manifest_rows: list[dict] = []
 
-                full_path = Path(root) / fname
+        def _checkpoint():
+            upsert_manifest(db, manifest_rows)
+            db.commit()
+            manifest_rows.clear()
+            _report(stats, started)
 
-                existing = (
-                    db.query(Document)
-                    .filter_by(raw_path=str(full_path))
-                    .first()
-                )
-                if existing:
-                    continue
-
-                text = extract_text_if_pdf(full_path)
-
-                doc = Document(
-                    source_id=source.id,
-                    external_id=fname,
-                    doc_type="generic_pdf",
-                    title=fname,
-                    description=None,
-                    ingest_time=datetime.utcnow(),  # TODO: switch to timezone-aware
-                    text=text,
-                    raw_path=str(full_path),
-                    ocr_confidence=None,
-                    is_searchable=bool(text),
-                    meta_json=None,
+        paths = (str(p) for p in iter_candidate_files(EPSTEIN_SUBSET_DIR))
+        worker = partial(_extract_worker, source_id=source.id, page_chunk=page_chunk)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            work = plan_files(db, paths, stats)
+            if metrics is not None:
+                work = metrics.counted(work)
+            for result in _bounded_map(executor, worker, work, queue_size):
+                manifest_rows.append(
+                    {
+                        "path": result["path"],
+                        "size": result["size"],
+                        "mtime_ns": result["mtime_ns"],
+                        "sha256": result["sha256"],
+                        "status": result["status"],
+                        "updated_at": datetime.utcnow(),
+                    }
                 )
-                db.add(doc)
 
-        db.commit()
+                if result["status"] == MANIFEST_FAILED:
+                    stats["failed"] += 1
+                elif result["extracted"]:
+                    stats["docs"] += 1
+                    stats["pages"] += result["pages"]
+                else:
+                    stats["rehashed"] += 1
+                if metrics is not None:
+                    metrics.complete(units=result["pages"], failed=result["status"] == MANIFEST_FAILED)
+
+                if len(manifest_rows) >= batch_size:
+                    _checkpoint()
+
+        _checkpoint()
+        return stats
     finally:
         db.close()
 
 
+def _report(stats: dict, started: float) -> None:
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    print(
+        f"[epstein_subset] {stats['docs']} docs, {stats['pages']} pages "
+        f"({stats['docs'] / elapsed:.1f} docs/s, {stats['pages'] / elapsed:.1f} pages/s); "
+        f"{stats['unchanged']} unchanged, {stats['rehashed']} rehashed, {stats['failed']} failed"
+    )
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Ingest the local Epstein subset")
+    parser.add_argument("--workers", type=int, default=None, help="Extraction processes (default: all cores)")
+    parser.add_argument("--batch-size", type=int, default=200, help="Files per checkpoint commit")
+    parser.add_argument("--queue-size", type=int, default=None, help="Max files in flight (default: 4 x workers)")
+    parser.add_argument("--page-chunk", type=int, default=PAGE_CHUNK, help="Page rows per insert")
+    args = parser.parse_args()
+
     # Ensure tables exist (safe if already created)
     Base.metadata.create_all(bind=engine)
-    ingest_epstein_subset()
+    ingest_epstein_subset(
+        workers=args.workers,
+        batch_size=args.batch_size,
+        queue_size=args.queue_size,
+        page_chunk=args.page_chunk,
+    )
     print("Ingestion complete.")
 
 
@@ -0,0 +1,126 @@
+"""
+Memory check for the streaming flight log pipeline.
+
+Writes a synthetic flight log CSV, streams it through the reader and
+normaliser (and, with --load, the chunked merge into events) at a tenth of
+the size and at full size, and compares the traced peak memory of the two.
+A streaming pipeline should need about the same memory for both; the check
+fails (exit code 1) if the full run peaks at more than --max-ratio times the
+small one.
+
+    python -m backend.app.ingestion.flight_logs_memory_check --rows 2000000
+    python -m backend.app.ingestion.flight_logs_memory_check --rows 500000 --load
+
+Loaded rows are deleted again afterwards.
+"""
+import argparse
+import csv
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+from pathlib import Path
+
+from sqlalchemy import delete
+
+from backend.app.db.session import SessionLocal
+from backend.app.db.schema import Event
+from backend.app.analytics.rollup import mark_events_written
+from backend.app.ingestion.flight_logs_structured import (
+    CHUNK_ROWS,
+    FLIGHT_LOG_FIELDS,
+    flight_event_rows,
+    flight_log_key,
+    load_flight_log,
+)
+
+
+def write_synthetic_csv(path: Path, n_rows: int, seed: int = 0) -> None:
+    rnd = random.Random(seed)
+    airports = ["TEB", "PBI", "SAF", "JFK", "STT", "LGA", "MIA", "CMH"]
+    start = date(1995, 1, 1)
+    with path.open("w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(FLIGHT_LOG_FIELDS)
+        for i in range(n_rows):
+            day = start + timedelta(days=rnd.randrange(4000))
+            writer.writerow(
+                [
+                    day.strftime("%m/%d/%Y"),
+                    f"{rnd.randrange(24)}:{rnd.randrange(60):02d}",
+                    "G-1159B",
+                    f"N{rnd.randrange(900)}",
+                    rnd.choice(airports),
+                    rnd.choice(airports),
+                    str(rnd.randrange(3000)),
+                    str(i % 1000),
+                    "",
+                    "1",
+                    "A",
+                ]
+            )
+
+
+def _delete_loaded(path: Path) -> None:
+    db = SessionLocal()
+    try:
+        prefix = f"{flight_log_key(path)}:"
+        db.execute(delete(Event).where(Event.source_key.startswith(prefix, autoescape=True)))
+        mark_events_written(db)
+        db.commit()
+    finally:
+        db.close()
+
+
+def traced_peak(path: Path, chunk_size: int, load: bool) -> float:
+    """Peak traced memory (MB) while streaming one CSV through the pipeline."""
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    if load:
+        load_flight_log(path, chunk_size=chunk_size)
+    else:
+        for _ in flight_event_rows(path):
+            pass
+    _, peak = tracemalloc.get_traced_memory()
+    return (peak - base) / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that flight log ingestion memory stays flat")
+    parser.add_argument("--rows", type=int, default=2_000_000, help="Rows in the full-size synthetic CSV")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--load", action="store_true", help="Also merge into events (needs a database)")
+    parser.add_argument("--max-ratio", type=float, default=1.5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        small = Path(tmp) / "flight_log_small.csv"
+        full = Path(tmp) / "flight_log_full.csv"
+        write_synthetic_csv(small, args.rows // 10, seed=1)
+        write_synthetic_csv(full, args.rows, seed=2)
+
+        tracemalloc.start()
+        try:
+            peaks = {}
+            for label, path in (("small", small), ("full", full)):
+                t0 = time.perf_counter()
+                peaks[label] = traced_peak(path, args.chunk_size, args.load)
+                print(f"[memory_check] {label}: peak {peaks[label]:.1f} MB in {time.perf_counter() - t0:.1f}s")
+        finally:
+            tracemalloc.stop()
+            if args.load:
+                _delete_loaded(small)
+                _delete_loaded(full)
+
+    ratio = peaks["full"] / max(peaks["small"], 1e-9)
+    print(f"[memory_check] {args.rows} rows vs {args.rows // 10}: peak ratio {ratio:.2f}")
+    if ratio > args.max_ratio:
+        print("[memory_check] FAIL: memory grows with file size")
+        sys.exit(1)
+    print("[memory_check] OK: memory is bounded by the chunk size")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,92 +1,281 @@
 # backend/app/ingestion/flight_logs_structured.py
 
+import argparse
 import csv
+import os
+import pickle
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, date, time as dt_time
+from functools import partial
+from itertools import chain, islice
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, Iterable, Iterator, Dict, Any, List
 
-from sqlalchemy.orm import Session
-
-from backend.app.db.session import SessionLocal
-from backend.app.db.schema import Event
+from backend.app.db.session import SessionLocal, engine
+from backend.app.analytics import rollup
+from backend.app.ingestion.dates import INFER_SAMPLE_SIZE, date_parser, time_parser
 
 
 FLIGHT_LOGS_DIR = Path("data/extracted/tables/flight_logs")
+FLIGHT_LOG_FIELDS = (
+    "date",
+    "time",
+    "aircraft_make_model",
+    "aircraft_id",
+    "origin",
+    "destination",
+    "miles_flown",
+    "flight_no",
+    "remarks",
+    "landings",
+    "aircraft_category",
+)
+PARSE_BATCH = 10_000
+CHUNK_ROWS = 10_000
+
+
+# Shared parsers for one-off calls; ingestion builds one per file so the
+# winning format can be inferred from that file's own values
+_DATES = date_parser()
+_TIMES = time_parser()
 
 
 def parse_date(date_str: str) -> Optional[date]:
     """Parse a date string into a date object, or return None."""
-    if not date_str:
-        return None
-
-    # Try a couple of common formats; extend as needed
-    for fmt in ("%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y", "%m/%d/%Y"):
-        try:
-            return datetime.strptime(date_str.strip(), fmt).date()
-        except ValueError:
-            continue
-
-    # If nothing works, you can log/print and skip
-    # print(f"Could not parse date: {date_str!r}")
-    return None
+    return _DATES.parse(date_str)
 
 
 def parse_time(time_str: str) -> Optional[dt_time]:
     """Parse a time string into a time object, or return None."""
-    if not time_str:
-        return None
-
-    # Very basic; tweak when you see real data (e.g. "13:45", "1:45 PM")
-    for fmt in ("%H:%M", "%H:%M:%S", "%I:%M %p"):
-        try:
-            return datetime.strptime(time_str.strip(), fmt).time()
-        except ValueError:
-            continue
-
-    return None
+    return _TIMES.parse(time_str)
 
 
 def build_event_time(date_str: str, time_str: str) -> Optional[datetime]:
     """Combine date and time strings into a timezone-naive datetime."""
-    d = parse_date(date_str)
-    if not d:
-        return None
+    return combine_event_time(parse_date(date_str), parse_time(time_str))
 
-    t = parse_time(time_str) if time_str else None
-    if not t:
-        # Default to midnight if no time
-        t = dt_time(0, 0, 0)
 
-    return datetime.combine(d, t)
+def combine_event_time(d: Optional[date], t: Optional[dt_time]) -> Optional[datetime]:
+    if not d:
+        return None
+    # Default to midnight if no time
+    return datetime.combine(d, t or dt_time(0, 0, 0))
 
 
-def read_flight_log_csv(path: Path) -> List[Dict[str, Any]]:
-    """Read one flight log CSV into a list of row dicts."""
-    rows: List[Dict[str, Any]] = []
+def read_flight_log_csv(path: Path) -> Iterator[Dict[str, Any]]:
+    """
+    Stream one flight log CSV as normalised row dicts. "line_no" is the
+    file line on which the record ends.
+    """
     with path.open("r", encoding="utf-8", newline="") as f:
         reader = csv.DictReader(f)
         for raw in reader:
             # Normalise keys we expect; DictReader will give them as-is
-            rows.append({
-                "date": (raw.get("date") or "").strip(),
-                "time": (raw.get("time") or "").strip(),
-                "aircraft_make_model": (raw.get("aircraft_make_model") or "").strip(),
-                "aircraft_id": (raw.get("aircraft_id") or "").strip(),
-                "origin": (raw.get("origin") or "").strip(),
-                "destination": (raw.get("destination") or "").strip(),
-                "miles_flown": (raw.get("miles_flown") or "").strip(),
-                "flight_no": (raw.get("flight_no") or "").strip(),
-                "remarks": (raw.get("remarks") or "").strip(),
-                "landings": (raw.get("landings") or "").strip(),
-                "aircraft_category": (raw.get("aircraft_category") or "").strip(),
-            })
-    return rows
-
-
-def ingest_flight_logs(session: Session) -> None:
+            row = {field: (raw.get(field) or "").strip() for field in FLIGHT_LOG_FIELDS}
+            row["line_no"] = reader.line_num
+            yield row
+
+
+def relative_to_flight_logs(posix_path: str) -> str:
+    """
+    The part of a forward-slash path after its FLIGHT_LOGS_DIR segments
+    (".../data/extracted/tables/flight_logs/2001/log.csv" -> "2001/log.csv"),
+    or the path unchanged if it does not pass through that directory.
+    """
+    marker = FLIGHT_LOGS_DIR.as_posix() + "/"
+    at = posix_path.rfind(marker)
+    if at == 0 or (at > 0 and posix_path[at - 1] == "/"):
+        return posix_path[at + len(marker):]
+    return posix_path
+
+
+def flight_log_key(csv_path: Path) -> str:
+    """
+    The file part of a row's source_key: the path relative to FLIGHT_LOGS_DIR
+    with forward slashes, so it does not depend on the working directory or
+    on how the path was spelled. Files outside that directory use their
+    absolute path.
+    """
+    return relative_to_flight_logs(Path(csv_path).resolve().as_posix())
+
+
+def row_source_key(csv_path: Path, row: Dict[str, Any]) -> str:
+    """
+    Natural key for a CSV row: the file and the line the record ends on.
+    Stable across re-runs without remembering earlier rows; a re-extracted
+    file whose lines moved should have its events deleted and reloaded.
+    Keys from older loaders are converted by migrate_flight_event_keys.
+    """
+    return f"{flight_log_key(csv_path)}:{row['line_no']}"
+
+
+def flight_event_rows(csv_path: Path, parse_stats: Optional[Counter] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yield event dicts (Event column names as keys) for one flight log CSV.
+
+    Date and time formats are inferred from the first rows of the file and
+    each batch of PARSE_BATCH rows is parsed column-wise, so at most one
+    batch is held in memory. Once the file is exhausted, per-path parse
+    counts are added to parse_stats.
+    """
+    dates, times = date_parser(), time_parser()
+    rows = read_flight_log_csv(csv_path)
+    sample = list(islice(rows, INFER_SAMPLE_SIZE))
+    dates.infer(r["date"] for r in sample)
+    times.infer(r["time"] for r in sample)
+
+    for batch in _batches(chain(sample, rows), PARSE_BATCH):
+        # Skip empty lines (no date & no aircraft_id)
+        batch = [r for r in batch if r["date"] or r["aircraft_id"]]
+        days = dates.parse_column([r["date"] for r in batch])
+        clock = times.parse_column([r["time"] for r in batch])
+
+        for row, d, t in zip(batch, days, clock):
+            event_time = combine_event_time(d, t)
+            if not event_time:
+                # If we cannot parse date at all, skip this row for now
+                print(f"[flight_logs_structured] Skipping row with bad date: {row!r}")
+                continue
+            yield _flight_event(csv_path, row, event_time)
+
+    if parse_stats is not None:
+        for name, parser in (("date", dates), ("time", times)):
+            for path, n in parser.stats.items():
+                parse_stats[f"{name}_{path}"] += n
+
+
+def _batches(items: Iterable, size: int) -> Iterator[list]:
+    it = iter(items)
+    while batch := list(islice(it, size)):
+        yield batch
+
+
+def _flight_event(csv_path: Path, row: Dict[str, Any], event_time: datetime) -> Dict[str, Any]:
+    # Basic numeric parsing with soft failure
+    miles_flown = None
+    if row["miles_flown"]:
+        try:
+            miles_flown = float(row["miles_flown"])
+        except ValueError:
+            pass
+
+    landings = None
+    if row["landings"]:
+        try:
+            landings = int(row["landings"])
+        except ValueError:
+            pass
+
+    meta: Dict[str, Any] = {
+        "aircraft_make_model": row["aircraft_make_model"],
+        "aircraft_id": row["aircraft_id"],
+        "origin": row["origin"],
+        "destination": row["destination"],
+        "miles_flown": miles_flown,
+        "flight_no": row["flight_no"],
+        "remarks": row["remarks"],
+        "landings": landings,
+        "aircraft_category": row["aircraft_category"],
+        "source_csv": str(csv_path),
+    }
+
+    return {
+        "source_key": row_source_key(csv_path, row),
+        "event_type": "flight",
+        "event_time": event_time,
+        "description": f"Flight {row['flight_no'] or ''} {row['origin']}→{row['destination']}".strip(),
+        "meta_json": meta,
+    }
+
+
+def _init_worker() -> None:
+    # Forked workers must not reuse the parent's pooled connections
+    engine.dispose(close=False)
+
+
+def load_flight_log(csv_path: Path, chunk_size: int = CHUNK_ROWS) -> Dict[str, Any]:
+    """
+    Stream one CSV into events, merging and committing every chunk_size rows
+    so memory stays flat and an interrupted load keeps its finished chunks.
+    Returns counters for reporting.
+    """
+    stats: Counter = Counter()
+    started = time.perf_counter()
+    session = SessionLocal()
+    try:
+        for chunk in _batches(flight_event_rows(csv_path, stats), chunk_size):
+            stats["inserted"] += rollup.merge_events(session, chunk)
+            session.commit()
+            stats["rows"] += len(chunk)
+    finally:
+        session.close()
+    return {"path": str(csv_path), "elapsed": time.perf_counter() - started, **stats}
+
+
+def spool_flight_log(csv_path: Path, spool_dir: Path, chunk_size: int = CHUNK_ROWS) -> Dict[str, Any]:
+    """
+    Parse one CSV into event rows and pickle them to spool_dir in chunks of
+    chunk_size, without touching the database, so parsing can run ahead of
+    loading. Returns the chunk paths (in file order) and counters.
+    """
+    stats: Counter = Counter()
+    started = time.perf_counter()
+    st = csv_path.stat()
+    spool_dir.mkdir(parents=True, exist_ok=True)
+    chunks: List[str] = []
+    for i, chunk in enumerate(_batches(flight_event_rows(csv_path, stats), chunk_size)):
+        chunk_path = spool_dir / f"chunk-{i:06d}.pkl"
+        tmp = chunk_path.with_suffix(".tmp")
+        with tmp.open("wb") as f:
+            pickle.dump(chunk, f, protocol=pickle.HIGHEST_PROTOCOL)
+        # Rename when complete, so an interrupted run never leaves a torn chunk
+        os.replace(tmp, chunk_path)
+        chunks.append(str(chunk_path))
+        stats["rows"] += len(chunk)
+    return {
+        "path": str(csv_path),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "chunks": chunks,
+        "elapsed": time.perf_counter() - started,
+        **stats,
+    }
+
+
+def load_spooled_chunk(session, chunk_path: Path) -> Dict[str, int]:
+    """Merge one chunk written by spool_flight_log into events, commit, and delete it."""
+    with chunk_path.open("rb") as f:
+        rows = pickle.load(f)
+    inserted = rollup.merge_events(session, rows)
+    session.commit()
+    chunk_path.unlink()
+    return {"rows": len(rows), "inserted": inserted}
+
+
+def _report_file(result: Dict[str, Any]) -> None:
+    rate = result.get("rows", 0) / max(result["elapsed"], 1e-9)
+    print(
+        f"[flight_logs_structured] {result['path']}: {result.get('rows', 0)} rows, "
+        f"{result.get('inserted', 0)} new events ({rate:.0f} rows/s)"
+    )
+    print(
+        f"[flight_logs_structured]   slow-path parses: "
+        f"date {result.get('date_fallback', 0)} fallback / {result.get('date_unparsed', 0)} unparsed, "
+        f"time {result.get('time_fallback', 0)} fallback / {result.get('time_unparsed', 0)} unparsed"
+    )
+
+
+def ingest_flight_logs(chunk_size: int = CHUNK_ROWS, workers: Optional[int] = None) -> None:
     """
     Ingest all CSV flight logs under data/extracted/tables/flight_logs
     into the Event table as event_type='flight'.
+
+    Each CSV is streamed through load_flight_log; with workers > 1 several
+    files load concurrently in separate processes. Rows are bulk-merged on
+    their source_key (COPY + staging table on Postgres), so re-running only
+    adds rows that are not loaded yet.
     """
     if not FLIGHT_LOGS_DIR.exists():
         print(f"[flight_logs_structured] Directory not found: {FLIGHT_LOGS_DIR}")
@@ -97,72 +286,39 @@ def ingest_flight_logs(session: Session) -> None:
         print(f"[flight_logs_structured] No CSV files found in {FLIGHT_LOGS_DIR}")
         return
 
-    created = 0
-
-    for csv_path in csv_paths:
-        print(f"[flight_logs_structured] Processing {csv_path}")
-        rows = read_flight_log_csv(csv_path)
-
-        for row in rows:
-            # Skip empty lines (no date & no aircraft_id)
-            if not row["date"] and not row["aircraft_id"]:
-                continue
+    workers = min(workers or os.cpu_count() or 1, len(csv_paths))
+    started = time.perf_counter()
+    load = partial(load_flight_log, chunk_size=chunk_size)
 
-            event_time = build_event_time(row["date"], row["time"])
-            if not event_time:
-                # If we cannot parse date at all, skip this row for now
-                print(f"[flight_logs_structured] Skipping row with bad date: {row!r}")
-                continue
+    if workers == 1:
+        results = map(load, csv_paths)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+        results = executor.map(load, csv_paths)
 
-            # Basic numeric parsing with soft failure
-            miles_flown = None
-            if row["miles_flown"]:
-                try:
-                    miles_flown = float(row["miles_flown"])
-                except ValueError:
-                    pass
-
-            landings = None
-            if row["landings"]:
-                try:
-                    landings = int(row["landings"])
-                except ValueError:
-                    pass
-
-            meta: Dict[str, Any] = {
-                "aircraft_make_model": row["aircraft_make_model"],
-                "aircraft_id": row["aircraft_id"],
-                "origin": row["origin"],
-                "destination": row["destination"],
-                "miles_flown": miles_flown,
-                "flight_no": row["flight_no"],
-                "remarks": row["remarks"],
-                "landings": landings,
-                "aircraft_category": row["aircraft_category"],
-                "source_csv": str(csv_path),
-            }
-
-            event = Event(
-                event_type="flight",
-                event_time=event_time,
-                description=f"Flight {row['flight_no'] or ''} {row['origin']}→{row['destination']}".strip(),
-                meta_json=meta,
-            )
-
-            session.add(event)
-            created += 1
+    created = 0
+    read = 0
+    try:
+        for result in results:
+            _report_file(result)
+            created += result.get("inserted", 0)
+            read += result.get("rows", 0)
+    finally:
+        if executor is not None:
+            executor.shutdown()
 
-    session.commit()
-    print(f"[flight_logs_structured] Created {created} flight events")
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    print(f"[flight_logs_structured] Created {created} flight events from {read} rows ({read / elapsed:.0f} rows/s)")
 
 
 def main() -> None:
     """CLI entrypoint: python -m backend.app.ingestion.flight_logs_structured"""
-    session = SessionLocal()
-    try:
-        ingest_flight_logs(session)
-    finally:
-        session.close()
+    parser = argparse.ArgumentParser(description="Load structured flight log CSVs into events")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_ROWS, help="Rows per merge + commit")
+    parser.add_argument("--workers", type=int, default=None, help="CSV files loaded concurrently (default: all cores)")
+    args = parser.parse_args()
+    ingest_flight_logs(chunk_size=args.chunk_size, workers=args.workers)
 
 
 if __name__ == "__main__":
@@ -1,14 +1,29 @@
 from pathlib import Path
 import csv
+import time
+from typing import Iterator, List, Tuple
 
+from sqlalchemy import Column, MetaData, String, Table, case, func, insert, update
 from sqlalchemy.orm import Session
 
+from backend.app.db.copy import copy_rows
 from backend.app.db.session import SessionLocal
 from backend.app.db.schema import Document, Page
 
 VOL00001_DAT = Path(
     "data/raw/epstein_subset/DataSet 1/DataSet 1/VOL00001/DATA/VOL00001.DAT"
 )
+RANGE_CHUNK = 10_000
+
+# Session-scoped staging table for Bates ranges read from a load file
+_staging = MetaData()
+bates_ranges_tmp = Table(
+    "bates_ranges_tmp",
+    _staging,
+    Column("begin_bates", String, primary_key=True),
+    Column("end_bates", String, nullable=False),
+    prefixes=["TEMPORARY"],
+)
 
 
 def detect_delimiter(sample: str) -> str:
@@ -23,32 +38,84 @@ def detect_delimiter(sample: str) -> str:
     return best_delim
 
 
-def load_bates_ranges():
-    if not VOL00001_DAT.exists():
-        raise RuntimeError(f".DAT file not found at {VOL00001_DAT}")
+def iter_bates_ranges(dat_path: Path = VOL00001_DAT) -> Iterator[Tuple[str, str]]:
+    """
+    Stream (begin, end) Bates ranges from a load file in one pass: the header
+    line picks the delimiter and the rest of the same handle is parsed.
+    """
+    if not dat_path.exists():
+        raise RuntimeError(f".DAT file not found at {dat_path}")
 
-    with VOL00001_DAT.open("r", encoding="utf-8", errors="ignore") as f:
+    with dat_path.open("r", encoding="utf-8", errors="ignore", newline="") as f:
         first_line = f.readline().rstrip("\n\r")
         if not first_line:
-            raise RuntimeError("VOL00001.DAT appears to be empty.")
+            raise RuntimeError(f"{dat_path.name} appears to be empty.")
 
         delim = detect_delimiter(first_line)
-
-    # Parse the whole file
-    bates_rows = []
-    with VOL00001_DAT.open("r", encoding="utf-8", errors="ignore") as f:
-        reader = csv.DictReader(f, delimiter=delim)
+        header = next(csv.reader([first_line], delimiter=delim))
+        reader = csv.DictReader(f, fieldnames=header, delimiter=delim)
         for row in reader:
             # Columns look like: '', 'Begin Bates', '\x14', 'End Bates', ''
             begin = (row.get("Begin Bates") or "").strip()
             end = (row.get("End Bates") or "").strip()
             if begin:
-                bates_rows.append((begin, end or begin))
+                yield begin, end or begin
+
+
+def load_bates_ranges(dat_path: Path = VOL00001_DAT) -> List[Tuple[str, str]]:
+    return list(iter_bates_ranges(dat_path))
+
 
-    return bates_rows
+def stage_bates_ranges(db: Session, ranges: Iterator[Tuple[str, str]]) -> int:
+    """
+    Load ranges into the bates_ranges_tmp table on the session's connection
+    (COPY on Postgres, chunked executemany elsewhere). Duplicate begins keep
+    the first range. Returns the number of ranges read.
+    """
+    conn = db.connection()
+    bates_ranges_tmp.drop(conn, checkfirst=True)
+    bates_ranges_tmp.create(conn)
+
+    seen = set()
+    rows = (
+        {"begin_bates": begin, "end_bates": end}
+        for begin, end in ranges
+        if not (begin in seen or seen.add(begin))
+    )
+
+    if conn.dialect.name == "postgresql":
+        return copy_rows(db, bates_ranges_tmp.name, ("begin_bates", "end_bates"), rows, chunk_size=RANGE_CHUNK)
+
+    staged = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= RANGE_CHUNK:
+            conn.execute(insert(bates_ranges_tmp), chunk)
+            staged += len(chunk)
+            chunk = []
+    if chunk:
+        conn.execute(insert(bates_ranges_tmp), chunk)
+        staged += len(chunk)
+    return staged
+
+
+def _external_id_core():
+    """
+    SQL for external_id with its last extension removed
+    ('EFTA00000001.pdf' -> 'EFTA00000001'), like str.rsplit('.', 1)[0].
+    Uses only replace/rtrim/substr so it runs on Postgres and SQLite.
+    """
+    ext_id = Document.external_id
+    # rtrim drops every trailing non-dot character, leaving "...EFTA00000001."
+    through_last_dot = func.rtrim(ext_id, func.replace(ext_id, ".", ""))
+    return case(
+        (func.replace(ext_id, ".", "") == ext_id, ext_id),
+        else_=func.substr(through_last_dot, 1, func.length(through_last_dot) - 1),
+    )
 
 
-def apply_bates_to_pages():
+def apply_bates_to_pages(dat_path: Path = VOL00001_DAT) -> int:
     """
     For now we do a simple mapping:
     - Document.external_id already holds something like 'EFTA00000001.pdf'
@@ -56,40 +123,34 @@ def apply_bates_to_pages():
 
     This is approximate because we don't yet walk the .OPT/image mapping,
     but it gives us a first linkage between pages and Bates ids.
-    """
-    bates_rows = load_bates_ranges()
-    print(f"Loaded {len(bates_rows)} Bates ranges from VOL00001.DAT")
 
+    The ranges are staged in a temp table and applied with a single
+    UPDATE ... FROM, so the number of queries does not depend on the number
+    of pages. Returns the number of pages updated.
+    """
+    started = time.perf_counter()
     db: Session = SessionLocal()
     try:
-        # Build a map from Bates id -> (begin, end)
-        # For single-page docs here, begin == end.
-        bates_set = {begin for begin, _ in bates_rows}
-
-        # Update pages whose document external_id matches a Bates id-derived pattern
-        pages = (
-            db.query(Page)
-            .join(Document, Page.document_id == Document.id)
-            .all()
+        staged = stage_bates_ranges(db, iter_bates_ranges(dat_path))
+        print(f"Loaded {staged} Bates ranges from {dat_path.name}")
+
+        core = _external_id_core()
+        stmt = (
+            update(Page)
+            .where(
+                Page.document_id == Document.id,
+                bates_ranges_tmp.c.begin_bates == core,
+                Page.bates_id.is_distinct_from(core),
+            )
+            .values(bates_id=core)
+            .execution_options(synchronize_session=False)
         )
+        updated = db.execute(stmt).rowcount
 
-        updated = 0
-        for p in pages:
-            doc: Document = p.document
-            # external_id like 'EFTA00000001.pdf' -> strip extension
-            if doc.external_id:
-                core = doc.external_id.rsplit(".", 1)[0]
-            else:
-                core = None
-
-            # If the core looks like a Bates id in our set, assign it
-            if core and core in bates_set:
-                if p.bates_id != core:
-                    p.bates_id = core
-                    updated += 1
-
+        bates_ranges_tmp.drop(db.connection())
         db.commit()
-        print(f"Updated {updated} pages with Bates IDs.")
+        print(f"Updated {updated} pages with Bates IDs in {time.perf_counter() - started:.2f}s.")
+        return updated
     finally:
         db.close()
 
@@ -0,0 +1,78 @@
+"""
+Thread-safe progress counters for one ingestion stage.
+
+`items` are units of work handed to the stage (files, chunks) and `units` what
+they produced (pages, rows). queue_depth counts items submitted but not yet
+completed, i.e. waiting in a queue or running in a pool.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+
+class StageMetrics:
+    def __init__(
+        self,
+        name: str,
+        workers: int = 1,
+        queue_size: int = 0,
+        on_progress: Optional[Callable[["StageMetrics"], None]] = None,
+    ):
+        self.name = name
+        self.workers = workers
+        self.queue_size = queue_size
+        self.on_progress = on_progress
+        self.items = 0
+        self.units = 0
+        self.failed = 0
+        self.queue_depth = 0
+        self.peak_queue_depth = 0
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def finish(self) -> None:
+        if self.finished is None:
+            self.finished = time.perf_counter()
+
+    def enqueue(self, n: int = 1) -> None:
+        with self._lock:
+            self.queue_depth += n
+            self.peak_queue_depth = max(self.peak_queue_depth, self.queue_depth)
+
+    def counted(self, items: Iterable) -> Iterator:
+        """Pass items through, counting each one as enqueued when it is taken."""
+        for item in items:
+            self.enqueue()
+            yield item
+
+    def complete(self, units: int = 0, failed: bool = False) -> None:
+        with self._lock:
+            self.queue_depth -= 1
+            self.items += 1
+            self.units += units
+            self.failed += int(failed)
+        if self.on_progress is not None:
+            self.on_progress(self)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            end = self.finished or time.perf_counter()
+            elapsed = end - self.started if self.started is not None else 0.0
+            rate = 1 / elapsed if elapsed > 0 else 0.0
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "items": self.items,
+                "units": self.units,
+                "failed": self.failed,
+                "queue_depth": self.queue_depth,
+                "peak_queue_depth": self.peak_queue_depth,
+                "elapsed": round(elapsed, 3),
+                "items_per_s": round(self.items * rate, 2),
+                "units_per_s": round(self.units * rate, 2),
+            }
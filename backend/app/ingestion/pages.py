@@ -0,0 +1,102 @@
+"""
+Page-level text: stream pages out of a PDF and into the pages table.
+
+A document's text is never held in memory as a whole; at most one chunk of
+pages is buffered between the PDF and the database. Document-level text is
+rebuilt on demand from its pages with document_text.
+"""
+from pathlib import Path
+from typing import Iterable, Iterator, Tuple
+
+import fitz  # PyMuPDF
+from sqlalchemy import delete, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from backend.app.db.schema import EntityMention, Page
+from backend.app.db.upsert import dialect_insert
+
+PAGE_CHUNK = 200
+
+
+class PdfExtractionError(RuntimeError):
+    """A PDF could not be opened or a page's text could not be read."""
+
+
+def iter_pdf_pages(path: Path) -> Iterator[Tuple[int, str | None]]:
+    """
+    Yield (page_number, text) for each page of a PDF with embedded text,
+    1-based. Pages without text yield None. Non-PDFs yield nothing.
+    PyMuPDF errors are raised as PdfExtractionError.
+    """
+    if path.suffix.lower() != ".pdf":
+        return
+    try:
+        doc = fitz.open(path)
+    except (RuntimeError, ValueError) as exc:  # FileDataError and MuPDF errors are RuntimeErrors
+        raise PdfExtractionError(f"{path}: {exc}") from exc
+    with doc:
+        for index in range(doc.page_count):
+            try:
+                text = doc[index].get_text().strip()
+            except (RuntimeError, ValueError) as exc:
+                raise PdfExtractionError(f"{path} page {index + 1}: {exc}") from exc
+            yield index + 1, text or None
+
+
+def replace_pages(
+    conn: Connection,
+    document_id: int,
+    pages: Iterable[Tuple[int, str | None]],
+    chunk_size: int = PAGE_CHUNK,
+) -> Tuple[int, bool]:
+    """
+    Replace a document's pages with `pages`, upserting chunk_size rows per
+    executemany on (document_id, page_number). Existing rows keep their id
+    and bates_id and only get the new text; pages past the new page count
+    are deleted (mentions pointing at them lose their page_id). Returns
+    (page_count, any_text). The caller owns the transaction, so a document
+    never ends up with a partial page set.
+    """
+    stmt = dialect_insert(conn)(Page)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["document_id", "page_number"],
+        set_={"text": stmt.excluded.text},
+    )
+
+    n_pages = 0
+    any_text = False
+    chunk: list[dict] = []
+    for page_number, text in pages:
+        chunk.append({"document_id": document_id, "page_number": page_number, "text": text})
+        any_text = any_text or bool(text)
+        if len(chunk) >= chunk_size:
+            conn.execute(stmt, chunk)
+            n_pages += len(chunk)
+            chunk = []
+    if chunk:
+        conn.execute(stmt, chunk)
+        n_pages += len(chunk)
+
+    stale = select(Page.id).where(Page.document_id == document_id, Page.page_number > n_pages)
+    conn.execute(update(EntityMention).where(EntityMention.page_id.in_(stale)).values(page_id=None))
+    conn.execute(delete(Page).where(Page.document_id == document_id, Page.page_number > n_pages))
+    return n_pages, any_text
+
+
+def iter_document_pages(db: Session, document_id: int) -> Iterator[Tuple[int, str | None]]:
+    """Stream a document's (page_number, text) in page order."""
+    stmt = (
+        select(Page.page_number, Page.text)
+        .where(Page.document_id == document_id)
+        .order_by(Page.page_number)
+        .execution_options(yield_per=PAGE_CHUNK)
+    )
+    for page_number, text in db.execute(stmt):
+        yield page_number, text
+
+
+def document_text(db: Session, document_id: int) -> str | None:
+    """Full document text, joined from its pages the way extraction used to."""
+    text = "\n".join(t for _, t in iter_document_pages(db, document_id) if t).strip()
+    return text or None
@@ -0,0 +1,562 @@
+"""
+Staged ingestion job runner.
+
+A job runs the declared STAGES in order:
+
+    extract    files under data/raw/epstein_subset -> documents + pages  (process pool)
+    ocr        flight log PDFs under data/raw/flight_logs -> CSVs in the
+               flight_logs tables dir (scripts/ table extraction, else OCR)
+    structure  flight log CSVs -> parsed event rows, spooled in chunks   (process pool)
+    load       spooled chunks -> events via merge_events                 (thread pool)
+    index      Bates ids onto pages, then the Bates range index
+    analytics  burst sweep over the rollup, when the events data version moved
+
+structure and load overlap: parsed chunks go to the load threads through a
+bounded queue, and no further CSVs are submitted while it is full. Every pool
+keeps at most queue_size items in flight, so a slow stage stalls its producer
+instead of growing memory.
+
+The ocr stage runs the scripts/ tools as subprocesses (from the repository
+root, like every stage). PDFs with text tables go through
+pdf_to_csv_tables.py and flightlog_generic_to_strucutred.py; the rest are
+OCR'd with ocr_pdf_to_csv_flightlog1.py, which needs Poppler and Tesseract.
+Without them those PDFs are skipped with a message and retried next run.
+
+Job state lives in data/jobs/<job>.json: per-stage status and metrics
+(throughput, queue depth), size/mtime of the PDFs converted, CSVs fully
+loaded and load files indexed, and the data version the last sweep saw.
+Re-running a job resumes it: extract skips files the ingest manifest already
+has, ocr and structure skip files already converted or loaded, and
+index/analytics only run when their inputs changed.
+
+    python -m backend.app.ingestion.pipeline
+    python -m backend.app.ingestion.pipeline --job drop-2024-06 --stages structure,load
+    python -m backend.app.ingestion.pipeline --job drop-2024-06 --status
+"""
+import argparse
+import csv
+import hashlib
+import importlib.util
+import json
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from backend.app.config.settings import settings
+from backend.app.db.session import SessionLocal, engine
+from backend.app.analytics.rollup import current_data_version
+from backend.app.analytics.sweep import run_sweep
+from backend.app.ingestion.bates_index import MANIFEST_NAME, build_bates_index
+from backend.app.ingestion.epstein_subset import ingest_epstein_subset
+from backend.app.ingestion.flight_logs_structured import (
+    CHUNK_ROWS,
+    FLIGHT_LOGS_DIR,
+    load_spooled_chunk,
+    spool_flight_log,
+)
+from backend.app.ingestion.flight_logs_v1 import apply_bates_to_pages
+from backend.app.ingestion.metrics import StageMetrics
+
+STAGES = ("extract", "ocr", "structure", "load", "index", "analytics")
+JOBS_DIR = Path("data/jobs")
+RAW_ROOT = Path("data/raw")
+FLIGHT_LOG_PDF_DIR = RAW_ROOT / "flight_logs"
+SCRIPTS_DIR = Path("scripts")
+# Poppler (pdf2image) and Tesseract executables, and their Python bindings
+OCR_EXECUTABLES = ("pdfinfo", "pdftoppm", "tesseract")
+OCR_MODULES = ("pdf2image", "pytesseract")
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+REPORT_EVERY = 5.0
+
+
+class JobState:
+    """JSON job state, rewritten atomically on every save."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        if path.exists():
+            self.data = json.loads(path.read_text(encoding="utf-8"))
+        else:
+            self.data = {
+                "job": path.stem,
+                "created_at": datetime.utcnow().isoformat(),
+                "stages": {name: {"status": STATUS_PENDING} for name in STAGES},
+                "ocr_files": {},
+                "loaded_files": {},
+                "indexed_dats": {},
+                "analytics_version": None,
+            }
+
+    def stage(self, name: str) -> Dict[str, Any]:
+        return self.data["stages"].setdefault(name, {"status": STATUS_PENDING})
+
+    def is_current(self, section: str, path: Path) -> bool:
+        """True if path still has the size/mtime recorded for it under section."""
+        seen = self.data.setdefault(section, {}).get(str(path))
+        if not seen:
+            return False
+        st = path.stat()
+        return seen["size"] == st.st_size and seen["mtime_ns"] == st.st_mtime_ns
+
+    def mark_current(self, section: str, path: str, size: int, mtime_ns: int) -> None:
+        with self._lock:
+            self.data.setdefault(section, {})[path] = {"size": size, "mtime_ns": mtime_ns}
+
+    def is_loaded(self, csv_path: Path) -> bool:
+        return self.is_current("loaded_files", csv_path)
+
+    def mark_loaded(self, path: str, size: int, mtime_ns: int) -> None:
+        self.mark_current("loaded_files", path, size, mtime_ns)
+
+    def save(self) -> None:
+        with self._lock:
+            self.data["updated_at"] = datetime.utcnow().isoformat()
+            payload = json.dumps(self.data, indent=2)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".json.tmp")
+            tmp.write_text(payload, encoding="utf-8")
+            os.replace(tmp, self.path)
+
+
+class IngestJob:
+    def __init__(
+        self,
+        name: str = "default",
+        workers: Optional[int] = None,
+        structure_workers: Optional[int] = None,
+        load_workers: int = 2,
+        queue_size: Optional[int] = None,
+        chunk_size: int = CHUNK_ROWS,
+        dat_paths: Optional[Sequence[Path]] = None,
+        report_every: float = REPORT_EVERY,
+    ):
+        self.name = name
+        self.workers = workers or os.cpu_count() or 1
+        self.structure_workers = structure_workers or self.workers
+        if engine.dialect.name != "postgresql":
+            # Other backends (SQLite) take one writer at a time
+            load_workers = 1
+        self.load_workers = max(load_workers, 1)
+        self.queue_size = queue_size or 2 * self.workers
+        self.chunk_size = chunk_size
+        self.dat_paths = list(dat_paths) if dat_paths else None
+        self.report_every = report_every
+        self.state = JobState(JOBS_DIR / f"{name}.json")
+        self.spool_dir = JOBS_DIR / name / "spool"
+        self.metrics: Dict[str, StageMetrics] = {}
+        self._last_report = 0.0
+        self._report_lock = threading.Lock()
+        self._changed: Dict[str, bool] = {}
+
+    # -- bookkeeping ---------------------------------------------------------
+
+    def _stage_metrics(self, name: str, workers: int, queue_size: int) -> StageMetrics:
+        metrics = StageMetrics(name, workers=workers, queue_size=queue_size, on_progress=self._progress)
+        self.metrics[name] = metrics
+        return metrics
+
+    def _progress(self, _metrics: StageMetrics) -> None:
+        # Called from whichever thread completed an item; rate-limited
+        now = time.perf_counter()
+        with self._report_lock:
+            if now - self._last_report < self.report_every:
+                return
+            self._last_report = now
+        for name, metrics in self.metrics.items():
+            snap = metrics.snapshot()
+            self.state.stage(name)["metrics"] = snap
+            if metrics.finished is None:
+                print(_format_metrics(name, snap))
+        self.state.save()
+
+    def _run_stage(self, name: str) -> None:
+        stage = self.state.stage(name)
+        stage.update(status=STATUS_RUNNING, started_at=datetime.utcnow().isoformat())
+        stage.pop("error", None)
+        self.state.save()
+        try:
+            getattr(self, f"_{name}")()
+        except BaseException as exc:
+            stage.update(status=STATUS_FAILED, error=repr(exc))
+            raise
+        else:
+            stage.update(status=STATUS_DONE, finished_at=datetime.utcnow().isoformat())
+        finally:
+            if name in self.metrics:
+                self.metrics[name].finish()
+                stage["metrics"] = self.metrics[name].snapshot()
+                print(_format_metrics(name, stage["metrics"]))
+            self.state.save()
+
+    def run(self, stages: Sequence[str] = STAGES) -> None:
+        unknown = set(stages) - set(STAGES)
+        if unknown:
+            raise ValueError(f"Unknown stages: {sorted(unknown)}")
+        started = time.perf_counter()
+        ordered = [name for name in STAGES if name in stages]
+        print(f"[pipeline] job {self.name!r}: {' -> '.join(ordered)}")
+        for name in ordered:
+            if name == "load" and "structure" in ordered:
+                continue  # runs alongside structure
+            self._run_stage(name)
+        print(f"[pipeline] job {self.name!r} finished in {time.perf_counter() - started:.1f}s")
+
+    # -- stages --------------------------------------------------------------
+
+    def _extract(self) -> None:
+        metrics = self._stage_metrics("extract", self.workers, self.queue_size)
+        metrics.start()
+        stats = ingest_epstein_subset(workers=self.workers, queue_size=self.queue_size, metrics=metrics)
+        self._changed["extract"] = stats["docs"] > 0
+
+    def _ocr(self) -> None:
+        pdfs = sorted(FLIGHT_LOG_PDF_DIR.glob("*.pdf")) if FLIGHT_LOG_PDF_DIR.exists() else []
+        todo = [p for p in pdfs if not (self.state.is_current("ocr_files", p) and _structured_csv(p).exists())]
+        print(f"[pipeline] ocr: {len(todo)} flight log PDFs to convert, {len(pdfs) - len(todo)} already converted")
+        if not todo:
+            return
+        missing = _missing_ocr_tools()
+        if missing:
+            print(
+                f"[pipeline] ocr: {', '.join(missing)} not found; PDFs without text tables are skipped "
+                "until Poppler and Tesseract are installed"
+            )
+
+        metrics = self._stage_metrics("ocr", self.workers, 1)
+        metrics.start()
+        work_dir = JOBS_DIR / self.name / "tables"
+        try:
+            for pdf_path in metrics.counted(todo):
+                st = pdf_path.stat()
+                rows = self._convert_flight_log(pdf_path, work_dir, can_ocr=not missing)
+                if rows is not None:
+                    self.state.mark_current("ocr_files", str(pdf_path), st.st_size, st.st_mtime_ns)
+                metrics.complete(units=rows or 0, failed=rows is None)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def _convert_flight_log(self, pdf_path: Path, work_dir: Path, can_ocr: bool) -> Optional[int]:
+        """
+        Write pdf_path's structured CSV into FLIGHT_LOGS_DIR: from its text
+        tables if it has any, otherwise by OCR. Returns the rows written, or
+        None if the PDF could not be converted (it is retried next run).
+        """
+        out_path = _structured_csv(pdf_path)
+        # Not *.csv, so structure never sees a half-written file
+        tmp_path = out_path.with_name(out_path.name + ".tmp")
+        generic = work_dir / f"{pdf_path.stem}_table1.csv"
+        workers = str(self.workers)
+
+        table_rows = 0
+        if _run_script("pdf_to_csv_tables.py", pdf_path, "--out", generic, "--workers", workers):
+            table_rows = _count_csv_rows(generic)
+        if table_rows:
+            ok = _run_script("flightlog_generic_to_strucutred.py", "--generic", generic, "--out", tmp_path)
+        elif can_ocr:
+            ok = _run_script("ocr_pdf_to_csv_flightlog1.py", "--pdf", pdf_path, "--out", tmp_path, "--workers", workers)
+        else:
+            print(f"[pipeline] ocr: {pdf_path} has no text tables and OCR is unavailable, skipping")
+            return None
+        if not ok:
+            tmp_path.unlink(missing_ok=True)
+            return None
+
+        os.replace(tmp_path, out_path)
+        rows = _count_csv_rows(out_path) - 1  # header
+        print(f"[pipeline] ocr: {pdf_path} -> {out_path} ({rows} rows, {'tables' if table_rows else 'OCR'})")
+        return rows
+
+    def _structure(self) -> None:
+        try:
+            self._structure_and_load()
+        except BaseException as exc:
+            stage = self.state.stage("load")
+            stage.update(status=STATUS_FAILED, error=repr(exc))
+            if "load" in self.metrics:
+                self.metrics["load"].finish()
+                stage["metrics"] = self.metrics["load"].snapshot()
+            raise
+
+    def _load(self) -> None:
+        """Load chunks spooled by an earlier, interrupted run without re-parsing."""
+        load = self._stage_metrics("load", self.load_workers, self.queue_size)
+        load.start()
+        chunks = sorted(self.spool_dir.glob("*/chunk-*.pkl")) if self.spool_dir.exists() else []
+        inserted = 0
+        session = SessionLocal()
+        try:
+            for chunk_path in load.counted(chunks):
+                result = load_spooled_chunk(session, chunk_path)
+                inserted += result["inserted"]
+                load.complete(units=result["rows"])
+        finally:
+            session.close()
+        shutil.rmtree(self.spool_dir, ignore_errors=True)
+        self._changed["load"] = inserted > 0
+        print(f"[pipeline] load: {inserted} new events from {len(chunks)} spooled chunks")
+
+    def _structure_and_load(self) -> None:
+        """Parse CSVs in a process pool and stream their chunks to the load threads."""
+        if not FLIGHT_LOGS_DIR.exists():
+            print(f"[pipeline] structure: {FLIGHT_LOGS_DIR} not found, nothing to do")
+            self._changed["load"] = False
+            return
+
+        csv_paths = [p for p in sorted(FLIGHT_LOGS_DIR.glob("*.csv")) if not self.state.is_loaded(p)]
+        skipped = len(list(FLIGHT_LOGS_DIR.glob("*.csv"))) - len(csv_paths)
+        print(f"[pipeline] structure: {len(csv_paths)} CSVs to load, {skipped} already loaded")
+
+        # A crashed run leaves partial spools behind; their rows are merged
+        # idempotently, so re-parsing from scratch is always safe
+        shutil.rmtree(self.spool_dir, ignore_errors=True)
+
+        structure = self._stage_metrics("structure", self.structure_workers, self.queue_size)
+        # Chunks in the queue, one in hand per writer and one waiting to be queued
+        load = self._stage_metrics("load", self.load_workers, self.queue_size + self.load_workers + 1)
+        self.state.stage("load").update(status=STATUS_RUNNING, started_at=datetime.utcnow().isoformat())
+        self.state.stage("load").pop("error", None)
+        chunks: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=self.queue_size)
+        remaining: Dict[str, List] = {}
+        remaining_lock = threading.Lock()
+        errors: List[BaseException] = []
+        inserted = [0]
+
+        def _file_done(path: str) -> None:
+            size, mtime_ns, _ = remaining.pop(path)
+            self.state.mark_loaded(path, size, mtime_ns)
+
+        def _load_worker() -> None:
+            session = SessionLocal()
+            try:
+                while True:
+                    item = chunks.get()
+                    if item is None:
+                        return
+                    path, chunk_path = item
+                    result = load_spooled_chunk(session, Path(chunk_path))
+                    with remaining_lock:
+                        inserted[0] += result["inserted"]
+                        remaining[path][2] -= 1
+                        if remaining[path][2] == 0:
+                            _file_done(path)
+                    load.complete(units=result["rows"])
+            except BaseException as exc:
+                errors.append(exc)
+            finally:
+                session.close()
+
+        def _put(item) -> None:
+            # Blocks while load is behind; bail out if a load thread died
+            while True:
+                if errors:
+                    raise errors[0]
+                try:
+                    chunks.put(item, timeout=0.5)
+                    return
+                except queue.Full:
+                    continue
+
+        def _hand_off(result: Dict[str, Any]) -> None:
+            structure.complete(units=result["rows"])
+            with remaining_lock:
+                remaining[result["path"]] = [result["size"], result["mtime_ns"], len(result["chunks"])]
+                if not result["chunks"]:
+                    _file_done(result["path"])
+            for chunk_path in result["chunks"]:
+                load.enqueue()
+                _put((result["path"], chunk_path))
+
+        spool = partial(_spool_one, spool_dir=self.spool_dir, chunk_size=self.chunk_size)
+        threads: List[threading.Thread] = []
+        structure.start()
+        load.start()
+        try:
+            with ProcessPoolExecutor(max_workers=self.structure_workers) as executor:
+                pending: deque = deque()
+                for csv_path in structure.counted(csv_paths):
+                    pending.append(executor.submit(spool, csv_path))
+                    if not threads:
+                        # Start writers only after the pool has forked its workers
+                        threads = [threading.Thread(target=_load_worker, daemon=True) for _ in range(self.load_workers)]
+                        for t in threads:
+                            t.start()
+                    if len(pending) >= self.queue_size:
+                        _hand_off(pending.popleft().result())
+                while pending:
+                    _hand_off(pending.popleft().result())
+            structure.finish()
+            self.state.stage("structure")["metrics"] = structure.snapshot()
+        finally:
+            for _ in threads:
+                try:
+                    _put(None)
+                except BaseException:
+                    break
+            for t in threads:
+                t.join()
+
+        if errors:
+            raise errors[0]
+        load.finish()
+        self._changed["load"] = inserted[0] > 0
+        shutil.rmtree(self.spool_dir, ignore_errors=True)
+        stage = self.state.stage("load")
+        stage.update(status=STATUS_DONE, finished_at=datetime.utcnow().isoformat(), metrics=load.snapshot())
+        print(_format_metrics("load", stage["metrics"]))
+        print(f"[pipeline] load: {inserted[0]} new events")
+
+    def _index(self) -> None:
+        index_dir = Path(settings.bates_index_dir)
+        dat_paths = [p for p in (self.dat_paths or sorted(RAW_ROOT.rglob("*.DAT"))) if p.exists()]
+        if not dat_paths:
+            print(f"[pipeline] index: no load files found under {RAW_ROOT}, skipping")
+            return
+        indexed = self.state.data.setdefault("indexed_dats", {})
+        dats_current = set(indexed) == {str(p) for p in dat_paths} and all(
+            self.state.is_current("indexed_dats", p) for p in dat_paths
+        )
+        if not self._changed.get("extract", True) and dats_current and (index_dir / MANIFEST_NAME).exists():
+            print("[pipeline] index: no new documents or load files, Bates index is current")
+            return
+
+        metrics = self._stage_metrics("index", 1, len(dat_paths))
+        metrics.start()
+        stats = {str(p): p.stat() for p in dat_paths}
+        for dat_path in metrics.counted(dat_paths):
+            metrics.complete(units=apply_bates_to_pages(dat_path))
+        build_bates_index(dat_paths, index_dir)
+        indexed.clear()
+        for path, st in stats.items():
+            self.state.mark_current("indexed_dats", path, st.st_size, st.st_mtime_ns)
+
+    def _analytics(self) -> None:
+        db = SessionLocal()
+        try:
+            version = current_data_version(db)
+        finally:
+            db.close()
+        if version == self.state.data["analytics_version"]:
+            print(f"[pipeline] analytics: events unchanged (version {version}), skipping sweep")
+            return
+
+        metrics = self._stage_metrics("analytics", self.workers, 1)
+        metrics.start()
+        metrics.enqueue()
+        written = run_sweep(workers=self.workers)
+        metrics.complete(units=written)
+        print(f"[pipeline] analytics: wrote {written} burst results for events version {version}")
+        self.state.data["analytics_version"] = version
+
+
+def _structured_csv(pdf_path: Path) -> Path:
+    return FLIGHT_LOGS_DIR / f"{pdf_path.stem}_structured.csv"
+
+
+def _missing_ocr_tools() -> List[str]:
+    missing = [name for name in OCR_EXECUTABLES if shutil.which(name) is None]
+    missing += [name for name in OCR_MODULES if importlib.util.find_spec(name) is None]
+    return missing
+
+
+def _run_script(script: str, *args: Any) -> bool:
+    """Run scripts/<script> with this interpreter; on failure print its last output line."""
+    cmd = [sys.executable, str(SCRIPTS_DIR / script), *(str(a) for a in args)]
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        lines = (proc.stderr or proc.stdout).strip().splitlines()
+        print(f"[pipeline] ocr: {script} exited with {proc.returncode}: {lines[-1] if lines else ''}")
+        return False
+    return True
+
+
+def _count_csv_rows(path: Path) -> int:
+    if not path.exists():
+        return 0
+    with path.open("r", encoding="utf-8", newline="") as f:
+        return sum(1 for _ in csv.reader(f))
+
+
+def _spool_one(csv_path: Path, spool_dir: Path, chunk_size: int) -> Dict[str, Any]:
+    # One spool directory per CSV, unique even for equal file names
+    digest = hashlib.sha1(str(csv_path).encode("utf-8")).hexdigest()[:10]
+    return spool_flight_log(csv_path, spool_dir / f"{csv_path.stem}-{digest}", chunk_size)
+
+
+def _format_metrics(name: str, snap: Dict[str, Any]) -> str:
+    return (
+        f"[pipeline] {name}: {snap['items']} items ({snap['items_per_s']:.1f}/s), "
+        f"{snap['units']} units ({snap['units_per_s']:.0f}/s), "
+        f"queue {snap['queue_depth']}/{snap['queue_size']} (peak {snap['peak_queue_depth']}), "
+        f"{snap['failed']} failed, {snap['workers']} workers, {snap['elapsed']:.1f}s"
+    )
+
+
+def print_status(name: str) -> None:
+    path = JOBS_DIR / f"{name}.json"
+    if not path.exists():
+        print(f"[pipeline] no job state at {path}")
+        return
+    state = JobState(path).data
+    print(f"[pipeline] job {name!r} (updated {state.get('updated_at')})")
+    for stage in STAGES:
+        info = state["stages"].get(stage, {"status": STATUS_PENDING})
+        line = f"  {stage:<10} {info['status']}"
+        if "metrics" in info:
+            line += " - " + _format_metrics(stage, info["metrics"]).split(": ", 1)[1]
+        if "error" in info:
+            line += f" ({info['error']})"
+        print(line)
+    print(
+        f"  {len(state.get('ocr_files', {}))} PDFs converted, {len(state['loaded_files'])} CSVs loaded, "
+        f"{len(state.get('indexed_dats', {}))} load files indexed, "
+        f"analytics at events version {state['analytics_version']}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run ingestion stages end to end as a resumable job")
+    parser.add_argument("--job", type=str, default="default", help="Job name; state is kept in data/jobs/<job>.json")
+    parser.add_argument("--stages", type=str, default=",".join(STAGES), help="Comma-separated subset of stages")
+    parser.add_argument("--workers", type=int, default=None, help="Extract/analytics processes (default: all cores)")
+    parser.add_argument("--structure-workers", type=int, default=None, help="CSV parsing processes (default: --workers)")
+    parser.add_argument("--load-workers", type=int, default=2, help="Writer threads for the load stage")
+    parser.add_argument("--queue-size", type=int, default=None, help="Max items in flight per stage (default: 2 x workers)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_ROWS, help="Event rows per spooled chunk")
+    parser.add_argument("--dat", type=Path, action="append", help="Load files for the index stage (default: all *.DAT under data/raw)")
+    parser.add_argument("--report-every", type=float, default=REPORT_EVERY, help="Seconds between progress lines")
+    parser.add_argument("--status", action="store_true", help="Print the saved job state and exit")
+    args = parser.parse_args()
+
+    if args.status:
+        print_status(args.job)
+        return
+
+    job = IngestJob(
+        name=args.job,
+        workers=args.workers,
+        structure_workers=args.structure_workers,
+        load_workers=args.load_workers,
+        queue_size=args.queue_size,
+        chunk_size=args.chunk_size,
+        dat_paths=args.dat,
+        report_every=args.report_every,
+    )
+    job.run([s.strip() for s in args.stages.split(",") if s.strip()])
+
+
+if __name__ == "__main__":
+    main()
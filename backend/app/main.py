@@ -1,11 +1,24 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
 from backend.app.api.routes import router as api_router
+from backend.app.analytics.executor import analytics_executor
+from backend.app.db.async_session import async_engine
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Pooled asyncpg connections belong to this event loop; close them with it
+    await async_engine.dispose()
+    analytics_executor.shutdown(wait=False)
+
 
-app = FastAPI(title="True Anomaly API", version="0.1.0")
+app = FastAPI(title="True Anomaly API", version="0.1.0", lifespan=lifespan)
 
 app.include_router(api_router, prefix="/api")
 
 @app.get("/health")
-def health():
-    return {"status": "ok"}
\ No newline at end of file
+async def health():
+    return {"status": "ok"}
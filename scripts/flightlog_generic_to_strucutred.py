@@ -1,3 +1,4 @@
+import argparse
 import csv
 from pathlib import Path
 
@@ -20,9 +21,14 @@ HEADERS = [
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Map a generic table CSV onto the structured flight log columns")
+    parser.add_argument("--generic", type=Path, default=GENERIC_CSV, help="CSV written by pdf_to_csv_tables.py")
+    parser.add_argument("--out", type=Path, default=STRUCTURED_CSV)
+    args = parser.parse_args()
+
     rows_out = []
 
-    with GENERIC_CSV.open("r", encoding="utf-8", newline="") as f:
+    with args.generic.open("r", encoding="utf-8", newline="") as f:
         reader = csv.reader(f)
         for raw in reader:
             cells = [c.strip() for c in raw]
@@ -54,13 +60,13 @@ def main():
                 "",  # aircraft_category
             ])
 
-    STRUCTURED_CSV.parent.mkdir(parents=True, exist_ok=True)
-    with STRUCTURED_CSV.open("w", newline="", encoding="utf-8") as f:
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    with args.out.open("w", newline="", encoding="utf-8") as f:
         writer = csv.writer(f)
         writer.writerow(HEADERS)
         writer.writerows(rows_out)
 
-    print(f"Wrote structured CSV with {len(rows_out)} rows to {STRUCTURED_CSV}")
+    print(f"Wrote structured CSV with {len(rows_out)} rows to {args.out}")
 
 
 if __name__ == "__main__":
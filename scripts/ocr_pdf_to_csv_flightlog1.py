@@ -1,18 +1,30 @@
+import argparse
 import csv
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 
-from pdf2image import convert_from_path
+import numpy as np
+from pdf2image import convert_from_path, pdfinfo_from_path
 import pytesseract
 from pytesseract import Output
 from PIL import Image
 
+from page_cache import PageCache, file_sha256
+
 # Adjust if Tesseract is not on PATH
 # pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
 
 PDF_PATH = Path("data/raw/flight_logs/doj_maxwell_flight_log1.pdf")
 CSV_PATH = Path("data/extracted/tables/flight_logs/doj_maxwell_flight_log1_structured.csv")
+OCR_CACHE_DIR = Path("data/cache/ocr")
+
+TESSERACT_CONFIG = "--psm 6"
+# image_to_data columns kept for layout (and in the OCR cache)
+OCR_FIELDS = ("text", "left", "top", "width", "height", "conf")
 
 HEADERS = [
     "date",
@@ -36,12 +48,13 @@ class ColumnBand:
     x_max: float
 
 
-def detect_column_bands(image: Image.Image) -> List[ColumnBand]:
+def detect_column_bands(size: Tuple[int, int]) -> List[ColumnBand]:
     """
-    Define approximate column bands for the logbook layout.
+    Define approximate column bands for the logbook layout from the page
+    image size (width, height).
     For v1 we hard-code relative positions; later we can refine per page.
     """
-    width, _ = image.size
+    width, _ = size
 
     # These fractions are heuristic and may need tuning once you inspect output.
     # They assume columns from left to right: date, make/model, tail, from, to, miles, flight_no, remarks.
@@ -131,9 +144,111 @@ def map_row_to_fields(row_words: List[Dict[str, Any]], bands: List[ColumnBand])
     return out
 
 
-def process_page(image: Image.Image) -> List[Dict[str, str]]:
+def _row_ids(cy: np.ndarray, y_tol: float) -> np.ndarray:
     """
-    OCR a page image and return structured row dicts.
+    Row number for each word, with cy sorted ascending. Reproduces the
+    running-average clustering of group_words_into_rows: a gap above y_tol
+    always starts a new row, and only segments spanning more than y_tol need
+    the sequential running-average pass.
+    """
+    n = len(cy)
+    breaks = np.zeros(n, dtype=bool)
+    if n == 0:
+        return breaks.astype(np.int64)
+    breaks[1:] = np.diff(cy) > y_tol
+
+    starts = np.flatnonzero(breaks)
+    bounds = np.concatenate(([0], starts, [n])).tolist()
+    ys = cy.tolist()
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        if ys[hi - 1] - ys[lo] <= y_tol:
+            continue  # every word is within y_tol of any running average
+        last_y = ys[lo]
+        for i in range(lo + 1, hi):
+            y = ys[i]
+            if abs(y - last_y) <= y_tol:
+                last_y = (last_y + y) / 2
+            else:
+                breaks[i] = True
+                last_y = y
+    return np.cumsum(breaks)
+
+
+def _assign_bands(cx: np.ndarray, bands: List[ColumnBand]) -> np.ndarray:
+    """
+    Index into `bands` for each word: the first non-remarks band whose
+    [x_min, x_max) contains cx, otherwise the remarks band.
+    """
+    remarks = next(i for i, b in enumerate(bands) if b.name == "remarks")
+    candidates = [(b.x_min, b.x_max, i) for i, b in enumerate(bands) if b.name != "remarks"]
+    if not candidates:
+        return np.full(len(cx), remarks)
+    candidates.sort()
+    x_min = np.array([c[0] for c in candidates])
+    x_max = np.array([c[1] for c in candidates])
+    index = np.array([c[2] for c in candidates])
+
+    if np.all(x_min[1:] >= x_max[:-1]):
+        # Disjoint bands: at most one can contain cx
+        pos = np.searchsorted(x_min, cx, side="right") - 1
+        clipped = np.clip(pos, 0, None)
+        inside = (pos >= 0) & (cx < x_max[clipped])
+        return np.where(inside, index[clipped], remarks)
+
+    # Overlapping bands: first match in declaration order, as in map_row_to_fields
+    order = np.argsort(index)
+    conditions = [(x_min[j] <= cx) & (cx < x_max[j]) for j in order]
+    return np.select(conditions, index[order], default=remarks)
+
+
+def layout_rows_np(data: Dict[str, List[Any]], bands: List[ColumnBand], y_tol: int = 10) -> List[Dict[str, str]]:
+    """
+    Array-based equivalent of
+    [map_row_to_fields(row, bands) for row in group_words_into_rows(data, y_tol)].
+    """
+    texts = [t.strip() for t in data["text"]]
+    keep = np.array([i for i, t in enumerate(texts) if t], dtype=np.int64)
+    if not len(keep):
+        return []
+
+    left = np.asarray(data["left"], dtype=np.int64)[keep]
+    top = np.asarray(data["top"], dtype=np.int64)[keep]
+    cx = left + np.asarray(data["width"], dtype=np.int64)[keep] / 2
+    cy = top + np.asarray(data["height"], dtype=np.int64)[keep] / 2
+    words = np.array(texts, dtype=object)[keep]
+
+    by_y = np.argsort(cy, kind="stable")
+    cx, cy, words = cx[by_y], cy[by_y], words[by_y]
+    rows = _row_ids(cy, y_tol)
+
+    # Within a row: by cx, ties keep their cy order (lexsort is stable)
+    order = np.lexsort((cx, rows))
+    cx, rows, words = cx[order], rows[order], words[order]
+    band = _assign_bands(cx, bands)
+
+    # Group tokens by (row, band) keeping their cx order
+    grouped = np.lexsort((band, rows))
+    rows, band, words = rows[grouped], band[grouped], words[grouped]
+    edges = np.flatnonzero((np.diff(rows) != 0) | (np.diff(band) != 0)) + 1
+    starts = np.concatenate(([0], edges))
+    ends = np.concatenate((edges, [len(words)]))
+
+    names = [b.name for b in bands]
+    rows, band, words = rows.tolist(), band.tolist(), words.tolist()
+    out: List[Dict[str, str]] = []
+    current_row = None
+    for lo, hi in zip(starts.tolist(), ends.tolist()):
+        if rows[lo] != current_row:
+            current_row = rows[lo]
+            out.append({name: "" for name in names})
+        out[-1][names[band[lo]]] = " ".join(words[lo:hi]).strip()
+    return out
+
+
+def ocr_image(image: Image.Image) -> Dict[str, Any]:
+    """
+    Run Tesseract on a page image. Returns the image_to_data columns that
+    the layout step needs plus the image size, ready to be cached as JSON.
     """
     # Basic preprocessing: convert to grayscale, maybe increase contrast
     gray = image.convert("L")
@@ -141,15 +256,36 @@ def process_page(image: Image.Image) -> List[Dict[str, str]]:
     # You can experiment with thresholds if needed.
     # gray = gray.point(lambda x: 0 if x < 180 else 255, "1")
 
-    ocr_data = pytesseract.image_to_data(gray, output_type=Output.DICT, config="--psm 6")
-    rows_words = group_words_into_rows(ocr_data, y_tol=10)
+    data = pytesseract.image_to_data(gray, output_type=Output.DICT, config=TESSERACT_CONFIG)
+    page = {k: data[k] for k in OCR_FIELDS}
+    page["size"] = list(gray.size)
+    return page
+
+
+def layout_fields(ocr_data: Dict[str, Any], bands: List[ColumnBand], layout: str = "numpy") -> List[Dict[str, str]]:
+    """
+    Per-row field dicts for one page. layout is "numpy" (layout_rows_np),
+    "python" (the reference functions) or "verify" (run both and fail on
+    any difference).
+    """
+    if layout == "numpy":
+        return layout_rows_np(ocr_data, bands, y_tol=10)
+
+    reference = [map_row_to_fields(row, bands) for row in group_words_into_rows(ocr_data, y_tol=10)]
+    if layout == "verify" and layout_rows_np(ocr_data, bands, y_tol=10) != reference:
+        raise AssertionError("NumPy layout differs from the reference layout")
+    return reference
+
 
-    bands = detect_column_bands(gray)
+def layout_records(ocr_data: Dict[str, Any], layout: str = "numpy") -> List[Dict[str, str]]:
+    """
+    Turn one page of OCR output (see ocr_image) into structured row dicts.
+    """
+    bands = detect_column_bands(tuple(ocr_data["size"]))
 
     records: List[Dict[str, str]] = []
 
-    for row in rows_words:
-        fields = map_row_to_fields(row, bands)
+    for fields in layout_fields(ocr_data, bands, layout):
 
         # Heuristic: skip rows that clearly look like headers or totals
         text_all = " ".join(f for f in fields.values())
@@ -165,34 +301,124 @@ def process_page(image: Image.Image) -> List[Dict[str, str]]:
     return records
 
 
-def extract_flightlog_records(pdf_path: Path) -> List[Dict[str, str]]:
+def process_page(image: Image.Image) -> List[Dict[str, str]]:
     """
-    High-level: PDF -> images -> OCR -> row dicts with flight-log-ish fields.
+    OCR a page image and return structured row dicts.
     """
-    if not pdf_path.exists():
-        raise FileNotFoundError(pdf_path)
+    return layout_records(ocr_image(image))
+
 
-    # Render pages; you can restrict first few pages while testing (e.g. pages[0:2])
-    pages = convert_from_path(str(pdf_path), dpi=300)
+def page_count(pdf_path: Path) -> int:
+    return int(pdfinfo_from_path(str(pdf_path))["Pages"])
 
-    all_records: List[Dict[str, str]] = []
-    for idx, img in enumerate(pages):
-        print(f"[ocr] Processing page {idx + 1}/{len(pages)}")
-        page_records = process_page(img)
-        print(f"[ocr]  -> {len(page_records)} row candidates")
-        all_records.extend(page_records)
 
-    return all_records
+def _init_ocr_worker() -> None:
+    # One Tesseract thread per process; the pool provides the parallelism
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
 
 
-def write_structured_csv(records: List[Dict[str, str]], out_path: Path) -> None:
+def ocr_page(
+    pdf_path: str,
+    page_number: int,
+    dpi: int,
+    cache: Optional[PageCache] = None,
+    cache_key: Tuple = (),
+    layout: str = "numpy",
+) -> Tuple[int, List[Dict[str, str]], bool]:
+    """
+    Render a single page (1-based) and OCR it; only this page's image is in
+    memory. With a cache, Tesseract output is looked up under
+    cache_key + (page_number, dpi, TESSERACT_CONFIG) first, and a hit skips
+    rendering and OCR entirely. Returns (page_number, records, cache_hit).
+    """
+    key = (*cache_key, page_number, dpi, TESSERACT_CONFIG)
+    ocr_data = cache.get(key) if cache is not None else None
+    hit = ocr_data is not None
+    if not hit:
+        images = convert_from_path(pdf_path, dpi=dpi, first_page=page_number, last_page=page_number)
+        ocr_data = ocr_image(images[0])
+        if cache is not None:
+            cache.put(key, ocr_data)
+    return page_number, layout_records(ocr_data, layout), hit
+
+
+def iter_flightlog_pages(
+    pdf_path: Path,
+    dpi: int = 300,
+    workers: Optional[int] = None,
+    first_page: int = 1,
+    last_page: Optional[int] = None,
+    cache: Optional[PageCache] = None,
+    layout: str = "numpy",
+) -> Iterator[Tuple[int, List[Dict[str, str]], bool]]:
+    """
+    Yield (page_number, records, cache_hit) in page order. Pages are rendered
+    one at a time and OCR'd by a pool of `workers` processes; at most
+    2 x workers pages are in flight, so memory does not grow with the page
+    count. OCR output is cached per (PDF hash, Tesseract version, page, dpi,
+    config), so re-runs after layout changes skip Tesseract.
+    """
+    if not pdf_path.exists():
+        raise FileNotFoundError(pdf_path)
+
+    cache_key: Tuple = ()
+    if cache is not None:
+        cache_key = (file_sha256(pdf_path), str(pytesseract.get_tesseract_version()))
+
+    total = page_count(pdf_path)
+    last_page = min(last_page or total, total)
+    pages = range(first_page, last_page + 1)
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1:
+        for n in pages:
+            yield ocr_page(str(pdf_path), n, dpi, cache, cache_key, layout)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_ocr_worker) as executor:
+            pending: deque = deque()
+            for n in pages:
+                pending.append(executor.submit(ocr_page, str(pdf_path), n, dpi, cache, cache_key, layout))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    if cache is not None:
+        evicted = cache.prune()
+        if evicted:
+            print(f"[ocr] Evicted {evicted} cached pages")
+
+
+def extract_flightlog_records(
+    pdf_path: Path,
+    dpi: int = 300,
+    workers: Optional[int] = None,
+    first_page: int = 1,
+    last_page: Optional[int] = None,
+    cache: Optional[PageCache] = None,
+    layout: str = "numpy",
+) -> Iterator[Dict[str, str]]:
+    """
+    High-level: PDF -> images -> OCR -> row dicts with flight-log-ish fields,
+    streamed in page order.
+    """
+    pages = iter_flightlog_pages(pdf_path, dpi, workers, first_page, last_page, cache, layout)
+    for page_number, page_records, hit in pages:
+        source = " (cached OCR)" if hit else ""
+        print(f"[ocr] Page {page_number}: {len(page_records)} row candidates{source}")
+        yield from page_records
+
+
+def write_structured_csv(records: Iterable[Dict[str, str]], out_path: Path) -> int:
     out_path.parent.mkdir(parents=True, exist_ok=True)
 
     with out_path.open("w", newline="", encoding="utf-8") as f:
         writer = csv.writer(f)
         writer.writerow(HEADERS)
 
+        written = 0
         for r in records:
+            written += 1
             # Map fields into your schema; we leave time/landings/aircraft_category empty for now.
             writer.writerow(
                 [
@@ -209,15 +435,43 @@ def write_structured_csv(records: List[Dict[str, str]], out_path: Path) -> None:
                     "",  # aircraft_category
                 ]
             )
+    return written
 
 
 def main():
-    print(f"[ocr] Reading {PDF_PATH}")
-    records = extract_flightlog_records(PDF_PATH)
-    print(f"[ocr] Total row candidates: {len(records)}")
-
-    write_structured_csv(records, CSV_PATH)
-    print(f"[ocr] Wrote structured CSV to {CSV_PATH}")
+    parser = argparse.ArgumentParser(description="OCR a flight log PDF into the structured flight log CSV")
+    parser.add_argument("--pdf", type=Path, default=PDF_PATH)
+    parser.add_argument("--out", type=Path, default=CSV_PATH)
+    parser.add_argument("--dpi", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=None, help="OCR processes (default: all cores)")
+    parser.add_argument("--first-page", type=int, default=1)
+    parser.add_argument("--last-page", type=int, default=None)
+    parser.add_argument("--cache-dir", type=Path, default=OCR_CACHE_DIR, help="Where Tesseract output is cached")
+    parser.add_argument("--cache-max-mb", type=int, default=512, help="Evict least recently used pages above this")
+    parser.add_argument("--no-cache", action="store_true", help="Always re-run Tesseract")
+    parser.add_argument(
+        "--layout",
+        choices=("numpy", "python", "verify"),
+        default="numpy",
+        help="Row/column layout engine; verify runs both and fails on any difference",
+    )
+    args = parser.parse_args()
+
+    cache = None if args.no_cache else PageCache(args.cache_dir, max_bytes=args.cache_max_mb * 1024 * 1024)
+
+    print(f"[ocr] Reading {args.pdf}")
+    records = extract_flightlog_records(
+        args.pdf,
+        dpi=args.dpi,
+        workers=args.workers,
+        first_page=args.first_page,
+        last_page=args.last_page,
+        cache=cache,
+        layout=args.layout,
+    )
+    total = write_structured_csv(records, args.out)
+    print(f"[ocr] Total row candidates: {total}")
+    print(f"[ocr] Wrote structured CSV to {args.out}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,86 @@
+"""
+Small on-disk cache for per-page extraction results (OCR output, tables).
+
+Each entry is zlib-compressed JSON in its own file, named by the SHA-256 of
+its key, so workers in different processes can read and write it without
+coordination (writes go through a temp file and an atomic rename). Reads
+refresh the file's mtime; prune() then evicts least recently used entries
+until the cache is under max_bytes.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import zlib
+from pathlib import Path
+from typing import Any, Optional, Sequence
+
+HASH_BLOCK = 1 << 20
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class PageCache:
+    def __init__(self, root: Path, max_bytes: int = 512 * 1024 * 1024):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+
+    def _path(self, key: Sequence[Any]) -> Path:
+        digest = hashlib.sha256(json.dumps(list(key)).encode("utf-8")).hexdigest()
+        return self.root / digest[:2] / f"{digest}.json.z"
+
+    def get(self, key: Sequence[Any]) -> Optional[Any]:
+        path = self._path(key)
+        try:
+            payload = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return json.loads(zlib.decompress(payload))
+
+    def put(self, key: Sequence[Any], value: Any) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"), 6)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def prune(self) -> int:
+        """Evict least recently used entries beyond max_bytes; returns how many were removed."""
+        if not self.root.exists():
+            return 0
+        entries = []
+        for path in self.root.glob("*/*.json.z"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
@@ -1,49 +1,149 @@
 import csv
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 import pdfplumber
 
+from page_cache import PageCache, file_sha256
+
 # Root for raw PDFs and extracted tables
 RAW_ROOT = Path("data/raw")
 OUT_ROOT = Path("data/extracted/tables")
+TABLE_CACHE_DIR = Path("data/cache/tables")
+
+# Pages handed to a worker at once; each task opens the PDF once
+PAGE_WINDOW = 8
 
+# page.extract_tables() output: tables -> rows -> cells (str or None)
+PageTables = List[List[List[Optional[str]]]]
 
-def extract_tables(pdf_path: Path) -> List[List[str]]:
+
+def table_rows(tables: PageTables) -> Iterator[List[str]]:
     """
-    Extract all table rows (excluding header rows) from a PDF
-    into generic cell lists.
+    Turn one page's raw tables into generic cell lists (header rows and
+    empty rows dropped). Kept separate from extraction so heuristic changes
+    can be re-applied to cached pages.
     """
-    rows: List[List[str]] = []
+    for table in tables:
+        for r_idx, row in enumerate(table):
+            # Heuristic: skip first row of each table as header
+            if r_idx == 0:
+                continue
+            cells = [c.strip() if isinstance(c, str) else "" for c in row]
+            # Skip completely empty rows
+            if not any(cells):
+                continue
+            yield cells
+
 
+def _extract_pages(pdf_path: str, page_indices: List[int]) -> Dict[int, PageTables]:
+    """Worker: raw tables for a window of pages, opening the PDF once."""
     with pdfplumber.open(pdf_path) as pdf:
-        for page_idx, page in enumerate(pdf.pages):
-            tables = page.extract_tables()
-            if not tables:
-                continue
+        return {i: pdf.pages[i].extract_tables() for i in page_indices}
 
-            for table_idx, table in enumerate(tables):
-                for r_idx, row in enumerate(table):
-                    # Heuristic: skip first row of each table as header
-                    if r_idx == 0:
-                        continue
-                    cells = [c.strip() if isinstance(c, str) else "" for c in row]
-                    # Skip completely empty rows
-                    if not any(cells):
-                        continue
-                    rows.append(cells)
 
-    return rows
+def iter_page_tables(
+    pdf_path: Path,
+    workers: Optional[int] = None,
+    cache: Optional[PageCache] = None,
+    window: int = PAGE_WINDOW,
+) -> Iterator[Tuple[int, PageTables, bool]]:
+    """
+    Yield (page_idx, tables, cache_hit) in page order. Cached pages are read
+    straight from the cache; the rest are extracted in windows of `window`
+    pages by a pool of `workers` processes, with at most 2 x workers
+    windows in flight.
+    """
+    key: Tuple = ()
+    n_pages = None
+    if cache is not None:
+        key = (file_sha256(pdf_path), pdfplumber.__version__)
+        n_pages = cache.get((*key, "page_count"))
+    if n_pages is None:
+        with pdfplumber.open(pdf_path) as pdf:
+            n_pages = len(pdf.pages)
+        if cache is not None:
+            cache.put((*key, "page_count"), n_pages)
+
+    workers = workers or os.cpu_count() or 1
+    windows = [list(range(i, min(i + window, n_pages))) for i in range(0, n_pages, window)]
+
+    def _lookup(pages: List[int]) -> Dict[int, PageTables]:
+        if cache is None:
+            return {}
+        found = {}
+        for i in pages:
+            tables = cache.get((*key, i))
+            if tables is not None:
+                found[i] = tables
+        return found
+
+    def _emit(pages: List[int], cached: Dict[int, PageTables], fresh: Dict[int, PageTables]):
+        for i in pages:
+            if i in cached:
+                yield i, cached[i], True
+            else:
+                if cache is not None:
+                    cache.put((*key, i), fresh[i])
+                yield i, fresh[i], False
+
+    if workers == 1:
+        for pages in windows:
+            cached = _lookup(pages)
+            missing = [i for i in pages if i not in cached]
+            fresh = _extract_pages(str(pdf_path), missing) if missing else {}
+            yield from _emit(pages, cached, fresh)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending: deque = deque()
+
+            def _drain_one():
+                pages, cached, future = pending.popleft()
+                fresh = future.result() if future is not None else {}
+                return _emit(pages, cached, fresh)
+
+            for pages in windows:
+                cached = _lookup(pages)
+                missing = [i for i in pages if i not in cached]
+                future = executor.submit(_extract_pages, str(pdf_path), missing) if missing else None
+                pending.append((pages, cached, future))
+                if len(pending) >= 2 * workers:
+                    yield from _drain_one()
+            while pending:
+                yield from _drain_one()
+
+    if cache is not None:
+        cache.prune()
+
+
+def extract_tables(
+    pdf_path: Path,
+    workers: Optional[int] = None,
+    cache: Optional[PageCache] = None,
+) -> Iterator[List[str]]:
+    """
+    Stream all table rows (excluding header rows) from a PDF as generic
+    cell lists, in page order.
+    """
+    for _, tables, _ in iter_page_tables(pdf_path, workers=workers, cache=cache):
+        yield from table_rows(tables)
 
 
-def write_csv(rows: List[List[str]], out_path: Path, header: Optional[List[str]] = None) -> None:
+def write_csv(rows: Iterable[List[str]], out_path: Path, header: Optional[List[str]] = None) -> int:
     out_path.parent.mkdir(parents=True, exist_ok=True)
 
+    written = 0
     with out_path.open("w", newline="", encoding="utf-8") as f:
         writer = csv.writer(f)
         if header:
             writer.writerow(header)
-        writer.writerows(rows)
+        for row in rows:
+            writer.writerow(row)
+            written += 1
+    return written
 
 
 def default_output_path(pdf_path: Path) -> Path:
@@ -60,18 +160,23 @@ def main():
     parser = argparse.ArgumentParser(description="Extract tables from a PDF into a generic CSV")
     parser.add_argument("pdf_path", type=str, help="Path to input PDF (under data/raw/...)")
     parser.add_argument("--out", type=str, default=None, help="Optional explicit CSV output path")
+    parser.add_argument("--workers", type=int, default=None, help="Extraction processes (default: all cores)")
+    parser.add_argument("--cache-dir", type=str, default=str(TABLE_CACHE_DIR), help="Where per-page tables are cached")
+    parser.add_argument("--cache-max-mb", type=int, default=256, help="Evict least recently used pages above this")
+    parser.add_argument("--no-cache", action="store_true", help="Always re-extract every page")
     args = parser.parse_args()
 
     pdf_path = Path(args.pdf_path)
     if not pdf_path.exists():
         raise FileNotFoundError(pdf_path)
 
-    rows = extract_tables(pdf_path)
-    print(f"Extracted {len(rows)} table rows from {pdf_path}")
-
+    cache = None if args.no_cache else PageCache(Path(args.cache_dir), max_bytes=args.cache_max_mb * 1024 * 1024)
     out_path = Path(args.out) if args.out else default_output_path(pdf_path)
+
     # For generic export, we don’t force a header; callers can re-map later
-    write_csv(rows, out_path, header=None)
+    rows = extract_tables(pdf_path, workers=args.workers, cache=cache)
+    written = write_csv(rows, out_path, header=None)
+    print(f"Extracted {written} table rows from {pdf_path}")
     print(f"Wrote CSV to {out_path}")
 
 